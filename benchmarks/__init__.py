@@ -0,0 +1,7 @@
+"""
+benchmarks for the scheduler on synthetic wards
+
+  wards   seeded generator of staff tables and request grids
+  run     times every step from the request tab to the saved schedule
+  build   model size and build time, for each encoding
+"""
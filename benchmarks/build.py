@@ -0,0 +1,116 @@
+"""
+measure how long building the CP-SAT model takes for synthetic wards
+
+  python -m benchmarks.build [--staffs 10,50,100,200,500] [--days 28,31]
+                             [--repeat 3] [--encodings pairwise,compact]
+                             [--solve 10]
+
+cold is the first build for a ward shape, including the model skeleton,
+warm is the best of --repeat later builds that only copy the skeleton and
+patch the data
+terms counts the variables in every linear constraint and automaton,
+with --solve each model is also solved for at most that many seconds
+"""
+
+import sys
+import time
+import argparse
+
+import scheduler_engine
+from benchmarks.wards import synthetic_month
+
+
+def model_size(model):
+  """
+  number of constraints and of terms in them
+  """
+
+  constraints = model.proto.constraints
+  terms = 0
+  for i in range(len(constraints)):
+    constraint = constraints[i]
+    if constraint.has_linear():
+      terms += len(list(constraint.linear.vars))
+    elif constraint.has_automaton():
+      terms += len(list(constraint.automaton.exprs))
+  return len(constraints), terms
+
+
+def measure(num_staffs, days_in_month, repeat, encoding):
+  schedule_data, preference_data = synthetic_month(num_staffs, days_in_month)
+  scheduler_engine.model_skeletons.clear()
+
+  start = time.perf_counter()
+  model, _, _ = scheduler_engine.build_model(schedule_data, preference_data,
+                                             days_in_month, 7, 1,
+                                             encoding=encoding)
+  cold = time.perf_counter() - start
+
+  warm = None
+  for _ in range(repeat):
+    start = time.perf_counter()
+    scheduler_engine.build_model(schedule_data, preference_data,
+                                 days_in_month, 7, 1, encoding=encoding)
+    elapsed = time.perf_counter() - start
+    if warm is None or elapsed < warm:
+      warm = elapsed
+  return cold, warm, model
+
+
+def solve_time(model, seconds):
+  from ortools.sat.python import cp_model
+
+  solver = cp_model.CpSolver()
+  solver.parameters.max_time_in_seconds = seconds
+  status = solver.Solve(model)
+  return solver.StatusName(status), solver.WallTime()
+
+
+def parse_list(text):
+  return [int(value) for value in text.split(',')]
+
+
+def main(argv=None):
+  parser = argparse.ArgumentParser(prog='python -m benchmarks.build')
+  parser.add_argument('--staffs', type=parse_list, default=[10, 50, 100, 200, 500])
+  parser.add_argument('--days', type=parse_list, default=[28, 31])
+  parser.add_argument('--repeat', type=int, default=3)
+  parser.add_argument('--encodings', type=lambda text: text.split(','),
+                      default=[scheduler_engine.default_encoding])
+  parser.add_argument('--solve', type=float,
+                      help='also solve each model with this time limit')
+  args = parser.parse_args(argv)
+
+  # load ortools first so it is not counted in the first cold build
+  from ortools.sat.python import cp_model
+
+  header = '%6s %4s %-8s %10s %11s %9s %9s' % (
+    'staffs', 'days', 'encoding', 'shifts', 'constraints', 'terms', 'cold')
+  header += ' %9s' % 'warm'
+  if args.solve:
+    header += '  %s' % 'solve'
+  print(header)
+  for num_staffs in args.staffs:
+    for days_in_month in args.days:
+      for encoding in args.encodings:
+        cold, warm, model = measure(num_staffs, days_in_month, args.repeat,
+                                    encoding)
+        variables = num_staffs * days_in_month * scheduler_engine.num_shifts
+        constraints, terms = model_size(model)
+        line = '%6d %4d %-8s %10d %11d %9d %8.3fs' % (
+          num_staffs, days_in_month, encoding, variables, constraints, terms,
+          cold)
+        # no warm build with --repeat 0
+        if warm is None:
+          line += ' %9s' % '-'
+        else:
+          line += ' %8.3fs' % warm
+        if args.solve:
+          status, elapsed = solve_time(model, args.solve)
+          line += '  %s %.2fs' % (status, elapsed)
+        print(line)
+  return 0
+
+
+if __name__ == '__main__':
+  sys.exit(main())
@@ -0,0 +1,265 @@
+"""
+time every step of scheduling a synthetic ward and write a json report
+
+  python -m benchmarks.run [--staffs 10,20,50,100,200,500] [--days 30]
+                           [--seeds 0,1,2] [--repeat 3] [--time-limit 10]
+                           [--output report.json] [--compare old.json]
+
+steps, in seconds, the best of --repeat runs except solve:
+
+  update_states  recount the request grid (RequestCoverage)
+  highlight      count the shifts of the schedule grid (ScheduleHighlight)
+  build          build the model with an empty skeleton cache
+  solve          CP-SAT wall time, at most --time-limit
+  decode         read the roster from the solver
+  save_json      json of the schedule grid, load_json reads it back
+  save_db        save_month to an in-memory database, load_db reads it back
+
+the report also has the solver status, objective and statistics, and
+per ward size the spread of the objective over the seeds (the wards are
+busy enough that some requests are denied), so two versions can be
+compared with --compare
+"""
+
+import sys
+import json
+import time
+import platform
+import argparse
+from datetime import datetime
+
+import scheduler_db
+import scheduler_engine
+from benchmarks import wards
+
+
+steps = ['update_states', 'highlight', 'build', 'solve', 'decode',
+         'save_json', 'load_json', 'save_db', 'load_db']
+
+report_version = 1
+
+
+def best_time(function, repeat):
+  best = None
+  for _ in range(repeat):
+    start = time.perf_counter()
+    function()
+    elapsed = time.perf_counter() - start
+    if best is None or elapsed < best:
+      best = elapsed
+  return best
+
+
+def run_case(num_staffs, days_in_month, seed, repeat, time_limit):
+  """
+  timings and solver results for one synthetic ward
+  """
+
+  ward = wards.synthetic_ward(num_staffs, days_in_month, seed=seed)
+  request_data = ward.request_data
+  schedule_data = ward.schedule_data()
+  case = {'staffs': num_staffs, 'days': days_in_month, 'seed': seed}
+
+  case['update_states'] = best_time(
+    lambda: scheduler_engine.RequestCoverage(request_data, days_in_month),
+    repeat)
+  case['highlight'] = best_time(
+    lambda: scheduler_engine.ScheduleHighlight(schedule_data, request_data,
+                                               days_in_month), repeat)
+
+  def build():
+    scheduler_engine.model_skeletons.clear()
+    return scheduler_engine.build_model(schedule_data, request_data,
+                                        days_in_month, 7, 1)
+
+  case['build'] = best_time(build, repeat)
+  model, shifts, _ = build()
+
+  decode_times = []
+
+  def decode(values):
+    start = time.perf_counter()
+    rows = scheduler_engine.decode_solution(values, shifts, schedule_data,
+                                            request_data, days_in_month)
+    decode_times.append(time.perf_counter() - start)
+    return rows
+
+  profile = scheduler_engine.get_profile('quick').extended(time_limit)
+  result = scheduler_engine.run_solver(model, decode, profile, False)
+  case['solve'] = result.wall_time
+  case['decode'] = min(decode_times) if decode_times else None
+  case['status'] = result.status
+  case['objective'] = result.objective
+  case['conflicts'] = result.conflicts
+  case['branches'] = result.branches
+  case['first_solution'] = result.first_solution_time
+
+  if result.has_solution():
+    scheduler_engine.apply_solution(schedule_data, result.rows, days_in_month)
+    scheduler_engine.update_totals(schedule_data, days_in_month)
+
+  text = json.dumps(schedule_data)
+  case['save_json'] = best_time(lambda: json.dumps(schedule_data), repeat)
+  case['load_json'] = best_time(lambda: json.loads(text), repeat)
+
+  connection = scheduler_db.connect(':memory:')
+  cursor = connection.cursor()
+
+  def save():
+    scheduler_db.save_month(cursor, 'schedules', 2026, 1, schedule_data)
+    connection.commit()
+
+  case['save_db'] = best_time(save, repeat)
+  case['load_db'] = best_time(
+    lambda: scheduler_db.load_month(cursor, 'schedules', 2026, 1), repeat)
+  connection.close()
+  return case
+
+
+def objective_spread(results):
+  """
+  the statuses and the lowest, mean and highest objective over the seeds
+  of each ward size, only solved cases have an objective
+  """
+
+  groups = {}
+  for case in results:
+    groups.setdefault((case['staffs'], case['days']), []).append(case)
+
+  spread = []
+  for (num_staffs, days_in_month), cases in sorted(groups.items()):
+    objectives = [case['objective'] for case in cases
+                  if case['objective'] is not None]
+    statuses = {}
+    for case in cases:
+      statuses[case['status']] = statuses.get(case['status'], 0) + 1
+    group = {'staffs': num_staffs, 'days': days_in_month,
+             'cases': len(cases), 'statuses': statuses}
+    if objectives:
+      group['min'] = min(objectives)
+      group['mean'] = sum(objectives) / len(objectives)
+      group['max'] = max(objectives)
+    spread.append(group)
+  return spread
+
+
+def format_spread(group):
+  line = '%6d %4d %5d' % (group['staffs'], group['days'], group['cases'])
+  if 'mean' in group:
+    line += ' %8.1f %8.1f %8.1f' % (group['min'], group['mean'], group['max'])
+  else:
+    line += ' %8s %8s %8s' % ('-', '-', '-')
+  statuses = ', '.join('%s %d' % (status, count) for status, count
+                       in sorted(group['statuses'].items()))
+  return line + '  ' + statuses
+
+
+def environment():
+  from ortools import __version__ as ortools_version
+
+  return {
+    'python': platform.python_version(),
+    'ortools': ortools_version,
+    'platform': platform.platform(),
+    'num_cores': scheduler_engine.num_cores,
+  }
+
+
+def format_case(case):
+  line = '%6d %4d %4d' % (case['staffs'], case['days'], case['seed'])
+  for step in steps:
+    if case[step] is None:
+      line += ' %9s' % '-'
+    else:
+      line += ' %8.4fs' % case[step]
+  line += '  %s %s' % (case['status'], case['objective'])
+  return line
+
+
+def compare(old, new):
+  """
+  ratio of the new to the old time of every step, for the cases in both
+  """
+
+  old_cases = dict(((case['staffs'], case['days'], case['seed']), case)
+                   for case in old['results'])
+  lines = ['%6s %4s %4s' % ('staffs', 'days', 'seed') +
+           ''.join(' %9s' % step[:9] for step in steps) + '  objective']
+  for case in new['results']:
+    key = (case['staffs'], case['days'], case['seed'])
+    if key not in old_cases:
+      continue
+    old_case = old_cases[key]
+    line = '%6d %4d %4d' % key
+    for step in steps:
+      if case[step] is None or not old_case[step]:
+        line += ' %9s' % '-'
+      else:
+        line += ' %8.2fx' % (case[step] / old_case[step])
+    line += '  %s -> %s' % (old_case['objective'], case['objective'])
+    lines.append(line)
+  return '\n'.join(lines)
+
+
+def parse_list(text):
+  return [int(value) for value in text.split(',')]
+
+
+def main(argv=None):
+  parser = argparse.ArgumentParser(prog='python -m benchmarks.run')
+  parser.add_argument('--staffs', type=parse_list, default=wards.sizes)
+  parser.add_argument('--days', type=parse_list, default=[30])
+  parser.add_argument('--seeds', type=parse_list, default=[0, 1, 2])
+  parser.add_argument('--repeat', type=int, default=3)
+  parser.add_argument('--time-limit', type=float, default=10.0,
+                      help='seconds to solve each ward')
+  parser.add_argument('--output', help='write the report here, '
+                                       'default is stdout')
+  parser.add_argument('--compare', help='an earlier report to compare with')
+  args = parser.parse_args(argv)
+
+  # load ortools first so it is not counted in the first build
+  from ortools.sat.python import cp_model
+
+  report = {
+    'version': report_version,
+    'created': datetime.now().isoformat(timespec='seconds'),
+    'environment': environment(),
+    'time_limit': args.time_limit,
+    'repeat': args.repeat,
+    'results': [],
+  }
+
+  print('%6s %4s %4s' % ('staffs', 'days', 'seed') +
+        ''.join(' %9s' % step[:9] for step in steps) + '  status',
+        file=sys.stderr)
+  for num_staffs in args.staffs:
+    for days_in_month in args.days:
+      for seed in args.seeds:
+        case = run_case(num_staffs, days_in_month, seed, args.repeat,
+                        args.time_limit)
+        report['results'].append(case)
+        print(format_case(case), file=sys.stderr)
+
+  report['objectives'] = objective_spread(report['results'])
+  print('%6s %4s %5s %8s %8s %8s  %s' % ('staffs', 'days', 'cases', 'min',
+                                         'mean', 'max', 'statuses'),
+        file=sys.stderr)
+  for group in report['objectives']:
+    print(format_spread(group), file=sys.stderr)
+
+  text = json.dumps(report, indent=2)
+  if args.output:
+    with open(args.output, 'w') as f:
+      f.write(text + '\n')
+  else:
+    print(text)
+
+  if args.compare:
+    with open(args.compare) as f:
+      print(compare(json.load(f), report), file=sys.stderr)
+  return 0
+
+
+if __name__ == '__main__':
+  sys.exit(main())
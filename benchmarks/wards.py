@@ -0,0 +1,161 @@
+"""
+seeded generator of synthetic wards in the same layout the app uses
+
+a ward has a staff table and a leader table as loaded from the database
+and a request grid as prepare_request_data builds it, filled with
+requests the way staff usually hand them in:
+
+  - a few WW and FF days off, mostly around weekends
+  - a few popular days (a long weekend, a holiday) many staffs ask off
+  - sometimes a business trip (SS) of a few days
+  - a few requested shifts, mostly the preferred one
+  - a small share of staffs limited to their preferred shift
+
+the required staff per day takes demand of the ward's working days,
+split over the shifts like the app's defaults (2, 4, 3), so on busy
+days some requests have to be denied. the same seed gives the same ward
+"""
+
+import random
+
+import scheduler_engine
+from scheduler_engine import shift_types, shift_codes
+from scheduler_engine import day_off1, day_off2, business_travel
+from scheduler_engine import night_shift, day_shift, evening_shift
+from scheduler_engine import night_shift_count, day_shift_count
+from scheduler_engine import evening_shift_count
+
+
+# ward sizes the benchmarks cover
+sizes = [10, 20, 50, 100, 200, 500]
+
+# share of staffs preferring night, day and evening shifts
+preference_weights = [0.2, 0.5, 0.3]
+
+# share of the working days of the ward the required staffs take up
+demand = 0.75
+required_split = [night_shift_count, day_shift_count, evening_shift_count]
+
+popular_days = 3
+popular_share = 0.35
+
+limited_share = 0.05
+business_travel_share = 0.05
+shift_request_share = 0.3
+
+
+class Ward(object):
+  def __init__(self, staffs, leaders, request_data, first_day, days_in_month):
+    self.staffs = staffs
+    self.leaders = leaders
+    self.request_data = request_data
+    self.first_day = first_day
+    self.days_in_month = days_in_month
+
+  @property
+  def num_staffs(self):
+    return len(self.staffs)
+
+  def schedule_data(self):
+    """
+    the schedule grid of a month not scheduled yet
+    """
+
+    preference_data = [list(row) for row in self.request_data]
+    return scheduler_engine.prepare_schedule_data(
+      None, preference_data, self.staffs, self.days_in_month)
+
+
+def synthetic_staffs(num_staffs, rng):
+  """
+  staff records (id, staffId, name, preference) as load_staffs returns them
+  """
+
+  staffs = []
+  for i in range(num_staffs):
+    preference = rng.choices(shift_types, preference_weights)[0]
+    staffs.append((i+1, 'N%04d' % (i+1), 'staff %d' % (i+1), preference))
+  return staffs
+
+
+def required_staffs(num_staffs, days_in_month, num_days_off):
+  """
+  required staff of each shift per day, demand of the working days
+  """
+
+  total = demand * num_staffs * (days_in_month-num_days_off) / days_in_month
+  split = sum(required_split)
+  return [max(1, int(round(total * count / split)))
+          for count in required_split]
+
+
+def synthetic_ward(num_staffs, days_in_month=30, first_day=0, seed=0):
+  """
+  first_day is the weekday of the 1st, 0 for monday
+  """
+
+  rng = random.Random(seed)
+  staffs = synthetic_staffs(num_staffs, rng)
+  leaders = [(1, 'L0001', 'leader')]
+  data = scheduler_engine.prepare_request_data(None, staffs, leaders,
+                                               first_day, days_in_month)
+  days = range(2, days_in_month+2)
+  weekends = [day for day in days if data[0][day]]
+
+  required = required_staffs(num_staffs, days_in_month, len(weekends))
+  for n, count in enumerate(required):
+    for day in days:
+      data[n+1][day] = count
+
+  # the leader works day shifts and takes the weekends off
+  leader = data[scheduler_engine.leader_offset]
+  for day in days:
+    leader[day] = day_off1 if day in weekends else day_shift
+
+  def next_to_weekend():
+    if not weekends:
+      return rng.choice(days)
+    return min(max(rng.choice(weekends) + rng.choice([-1, 1]), 2),
+               days_in_month+1)
+
+  popular = [next_to_weekend() for _ in range(popular_days)]
+
+  for s, staff in enumerate(staffs):
+    row = data[scheduler_engine.staff_offset+s]
+    preferred = shift_codes[shift_types.index(staff[3])]
+
+    if rng.random() < limited_share:
+      row[1] = preferred
+
+    wanted = [day for day in popular if rng.random() < popular_share]
+    for _ in range(rng.randint(1, 4)):
+      # days off are asked for next to a weekend more often than not
+      wanted.append(next_to_weekend() if rng.random() < 0.6
+                    else rng.choice(days))
+    for day in wanted:
+      row[day] = day_off1 if rng.random() < 0.7 else day_off2
+
+    if rng.random() < business_travel_share:
+      start = rng.choice(days)
+      for day in range(start, min(start+rng.randint(1, 3), days_in_month+2)):
+        row[day] = business_travel
+
+    if rng.random() < shift_request_share and row[1] == '':
+      for _ in range(rng.randint(1, 3)):
+        day = rng.choice(days)
+        if row[day] == '':
+          row[day] = preferred if rng.random() < 0.8 else \
+            rng.choice([night_shift, day_shift, evening_shift])
+
+  # the totals the request tab shows
+  scheduler_engine.RequestCoverage(data, days_in_month)
+  return Ward(staffs, leaders, data, first_day, days_in_month)
+
+
+def synthetic_month(num_staffs, days_in_month, seed=0):
+  """
+  schedule and preference data of a synthetic ward
+  """
+
+  ward = synthetic_ward(num_staffs, days_in_month, seed=seed)
+  return ward.schedule_data(), ward.request_data
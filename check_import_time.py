@@ -0,0 +1,83 @@
+"""
+check that importing the scheduler modules stays within a time budget
+and does not pull in the heavy optional dependencies
+
+  python check_import_time.py [--budget 0.5] [--repeat 5]
+
+every import is measured in a fresh interpreter so cached modules
+do not hide the cost
+"""
+
+import os
+import sys
+import argparse
+import subprocess
+
+
+modules = ['scheduler_engine', 'scheduler_db', 'scheduler_cli', 'scheduler']
+
+# modules that should only be loaded when export/import or optimization is used
+lazy_modules = ['pandas', 'ortools']
+
+probe = """
+import sys, time
+start = time.perf_counter()
+import %s
+elapsed = time.perf_counter() - start
+loaded = [m for m in %r if m in sys.modules]
+print('%%f %%s' %% (elapsed, ','.join(loaded)))
+"""
+
+
+def measure(module, repeat):
+  """
+  returns the best import time in seconds and the lazy modules it loaded
+  or None if the module cannot be imported here
+  """
+
+  here = os.path.dirname(os.path.abspath(__file__))
+  best = None
+  loaded = []
+  for _ in range(repeat):
+    process = subprocess.run([sys.executable, '-c', probe % (module, lazy_modules)],
+                             cwd=here, stdout=subprocess.PIPE,
+                             stderr=subprocess.PIPE, universal_newlines=True)
+    if process.returncode != 0:
+      return None
+    elapsed, names = process.stdout.split(' ', 1)
+    elapsed = float(elapsed)
+    loaded = [n for n in names.strip().split(',') if n]
+    if best is None or elapsed < best:
+      best = elapsed
+  return best, loaded
+
+
+def main(argv=None):
+  parser = argparse.ArgumentParser()
+  parser.add_argument('--budget', type=float, default=0.5,
+                      help='maximum import time in seconds')
+  parser.add_argument('--repeat', type=int, default=5)
+  args = parser.parse_args(argv)
+
+  failed = False
+  for module in modules:
+    result = measure(module, args.repeat)
+    if result is None:
+      print('%-18s skipped (cannot be imported here)' % module)
+      continue
+
+    elapsed, loaded = result
+    status = 'ok'
+    if elapsed > args.budget:
+      status = 'over budget'
+      failed = True
+    if loaded:
+      status = 'eagerly imports %s' % ', '.join(loaded)
+      failed = True
+    print('%-18s %.3fs  %s' % (module, elapsed, status))
+
+  return 1 if failed else 0
+
+
+if __name__ == '__main__':
+  sys.exit(main())
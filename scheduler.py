@@ -1,67 +1,40 @@
-import os
 import sys
 from datetime import datetime, timedelta
 from calendar import monthrange
 import json
 
-import pandas as pd
-import sqlite3
-from ortools.sat.python import cp_model
-
 from PyQt5.QtWidgets import QApplication
 from PyQt5.QtWidgets import QMainWindow
 from PyQt5.QtWidgets import QMessageBox, QComboBox
 from PyQt5.QtWidgets import QFileDialog
-from PyQt5.QtWidgets import QAbstractItemView, QItemDelegate
+from PyQt5.QtWidgets import QItemDelegate
 from PyQt5.QtCore import Qt
 from PyQt5.QtCore import QAbstractTableModel
-from PyQt5.QtCore import QThread
-from PyQt5.QtCore import QObject, pyqtSignal, pyqtSlot
+from PyQt5.QtCore import QThread, QTimer
+from PyQt5.QtCore import QObject, pyqtSignal
 from PyQt5.QtGui import QBrush, QColor, QFont
 
 from scheduler_ui import Ui_MainWindow
+import scheduler_db
+import scheduler_engine
+import scheduler_timing
+from scheduler_timing import timed
+from scheduler_engine import shift_types
+from scheduler_engine import day_off1, day_off2, business_travel
+from scheduler_engine import night_shift, day_shift, evening_shift
+from scheduler_engine import night_shift_count, day_shift_count
+from scheduler_engine import evening_shift_count
+from scheduler_engine import unavailable
+from scheduler_engine import profile_names, default_profile
+
+
+# opened by init_db() at startup, not at import time
+database = None
+write_behind = None
 
+# milliseconds without edits before the queued months are written
+save_delay = 500
 
-connection = sqlite3.connect('db.sqlite3')
-cursor = connection.cursor()
-cursor.execute("""CREATE TABLE IF NOT EXISTS staffs(
-               id INTEGER PRIMARY KEY AUTOINCREMENT,
-               staffId INTEGER,
-               name TEXT NOT NULL,
-               preference TEXT NOT NULL);""")
-cursor.execute("""CREATE TABLE IF NOT EXISTS leaders(
-               id INTEGER PRIMARY KEY AUTOINCREMENT,
-               leaderId INTEGER,
-               name TEXT NOT NULL);""")
-cursor.execute("""CREATE TABLE IF NOT EXISTS requests(
-               id INTEGER PRIMARY KEY AUTOINCREMENT,
-               year INTEGER NOT NULL,
-               month INTEGER NOT NULL,
-               data TEXT NOT NULL);""")
-cursor.execute("""CREATE TABLE IF NOT EXISTS schedules(
-               id INTEGER PRIMARY KEY AUTOINCREMENT,
-               year INTEGER NOT NULL,
-               month INTEGER NOT NULL,
-               data TEXT NOT NULL);""")
-
-
-shift_types = ['大夜 (PH)',
-               '白班 (1~4)',
-               '小夜 (4N)']
-
-day_off1 = 'WW'
-day_off2 = 'FF'
-business_travel = 'SS'
-night_shift = 'PH'
-day_shift = 'DAY'
-evening_shift = '4N'
-staff_required = 9
-
-night_shift_count = 2
-evening_shift_count = 3
-day_shift_count = 4
-
-unavailable = [day_off1, day_off2, business_travel]
 
 color1 = QBrush(QColor(233, 114, 106))  # E9726A
 color2 = QBrush(QColor(106, 170, 233))  # 6AAAE9
@@ -70,10 +43,103 @@ color4 = QBrush(QColor(255, 32, 32))
 color5 = QBrush(QColor(110, 216, 96))
 #  color5 = QBrush(QColor(16, 45, 162))
 
+# background of a cell by its shift code
+code_brushes = {
+  day_off1: color3,
+  day_off2: color3,
+  business_travel: color3,
+  night_shift: color1,
+  evening_shift: color2,
+}
+
+# background of a staff name by the staff's preference
+preference_brushes = {
+  shift_types[0]: color1,
+  shift_types[2]: color2,
+}
+
+
+class WriteBehind(QObject):
+  """
+  queue the edited months and write them in one transaction
+  once editing pauses for save_delay milliseconds
+  """
+
+  status_message_signal = pyqtSignal(str)
+
+  def __init__(self, delay):
+    super(WriteBehind, self).__init__()
+
+    self.queue = scheduler_db.SaveQueue()
+    self.timer = QTimer(self)
+    self.timer.setSingleShot(True)
+    self.timer.setInterval(delay)
+    self.timer.timeout.connect(self.flush)
+
+  def save(self, table, year, month, data, cells=None):
+    self.queue.add(table, year, month, data, cells)
+    self.timer.start()
+
+  def flush(self):
+    self.timer.stop()
+    try:
+      self.queue.flush(database.connection())
+    except Exception as e:
+      self.status_message_signal.emit('Fail to save: %s' % str(e))
+
+
+def init_db(path='db.sqlite3'):
+  """
+  open the database and create the tables if needed
+  calling it again keeps the already opened database
+  """
+
+  global database, write_behind
+  if database is None:
+    database = scheduler_db.Database(path)
+    write_behind = WriteBehind(save_delay)
+  return database
+
 
 def close_db():
-  connection.commit()
-  connection.close()
+  global database, write_behind
+  if database is not None:
+    write_behind.timer.stop()
+    try:
+      scheduler_db.close_database(database, write_behind.queue)
+    except Exception as e:
+      message = 'Fail to save %d months: %s' % (len(write_behind.queue), str(e))
+      print(message, file=sys.stderr)
+      QMessageBox.critical(None, 'Error', message)
+    database = None
+    write_behind = None
+
+
+def load_month(table, year, month):
+  """
+  read a month from the database after writing out the queued edits
+  """
+
+  write_behind.flush()
+  return scheduler_db.load_month(database.cursor(), table, year, month)
+
+
+def emit_data_changed(model, top, left, bottom, right):
+  model.dataChanged.emit(model.index(top, left), model.index(bottom, right))
+
+
+def day_headers(current_date, first_day, days_in_month):
+  """
+  horizontal header text of the request and schedule tables
+  """
+
+  day_text = ['一', '二', '三', '四', '五', '六', '日']
+  headers = ['Name', 'Limit']
+  for col in range(2, days_in_month+2):
+    text = day_text[(first_day + col - 2) % len(day_text)]
+    headers.append('%d/%d\n%s' % (current_date.month, col-1, text))
+  headers.append('Total')
+  return headers
 
 
 class StaffModel(QAbstractTableModel):
@@ -85,8 +151,7 @@ class StaffModel(QAbstractTableModel):
     self.load_data()
 
   def load_data(self):
-    cursor.execute("""SELECT * FROM staffs;""")
-    data = cursor.fetchall()
+    data = scheduler_db.load_staffs(database.cursor())
     self.model_data = [list(row) for row in data]
 
   def rowCount(self, parent):
@@ -118,9 +183,8 @@ class StaffModel(QAbstractTableModel):
 
       if len(staff_id) == 0:
         try:
-          cursor.execute('''UPDATE staffs SET name = "%s" WHERE id = %d''' %
-                         (name, id))
-          connection.commit()
+          scheduler_db.update_staff(database.cursor(), id, name)
+          database.commit()
         except Exception as e:
           self.status_message_signal.emit(
             'Fail to edit staff %d: %s' % (id, str(e)))
@@ -128,10 +192,8 @@ class StaffModel(QAbstractTableModel):
         try:
           staff_id = int(self.model_data[index.row()][1])
 
-          cursor.execute('''UPDATE staffs
-                         SET staffId = %d, name = "%s" WHERE id = %d''' %
-                         (staff_id, name, id))
-          connection.commit()
+          scheduler_db.update_staff(database.cursor(), id, name, staff_id)
+          database.commit()
           return True
         except Exception as e:
           self.status_message_signal.emit(
@@ -161,19 +223,17 @@ class StaffModel(QAbstractTableModel):
     id = self.model_data[index.row()][0]
     pref = self.model_data[index.row()][3]
     try:
-      cursor.execute('''UPDATE staffs SET preference = "%s" WHERE id = %d''' %
-                      (pref, id))
-      connection.commit()
+      scheduler_db.update_staff_preference(database.cursor(), id, pref)
+      database.commit()
     except Exception as e:
       self.status_message_signal.emit(
         'Fail to edit staff %d: %s' % (id, str(e)))
 
   def add_staff(self, staff_id, name, preference_index):
     try:
-      cursor.execute("""INSERT INTO staffs(staffId, name, preference)
-                      VALUES(?, ?, ?)""",
-                     (staff_id, name, shift_types[preference_index]))
-      connection.commit()
+      scheduler_db.add_staff(database.cursor(), staff_id, name,
+                             shift_types[preference_index])
+      database.commit()
 
       self.update()
     except Exception as e:
@@ -183,10 +243,9 @@ class StaffModel(QAbstractTableModel):
 
   def delete_staff(self, selection):
     try:
-      for index in selection:
-        id = self.model_data[index.row()][0]
-        cursor.execute('''DELETE FROM staffs WHERE id = %d''' % (id))
-      connection.commit()
+      ids = [self.model_data[index.row()][0] for index in selection]
+      scheduler_db.delete_staffs(database.cursor(), ids)
+      database.commit()
 
       self.update()
     except Exception as e:
@@ -230,8 +289,7 @@ class LeaderModel(QAbstractTableModel):
     self.load_data()
 
   def load_data(self):
-    cursor.execute("""SELECT * FROM leaders;""")
-    data = cursor.fetchall()
+    data = scheduler_db.load_leaders(database.cursor())
     self.model_data = [list(row) for row in data]
 
   def rowCount(self, parent):
@@ -256,9 +314,8 @@ class LeaderModel(QAbstractTableModel):
       name = self.model_data[index.row()][2]
 
       try:
-        cursor.execute('''UPDATE leaders SET leaderId = %d, name = "%s" WHERE id = %d''' %
-                        (leader_id, name, id))
-        connection.commit()
+        scheduler_db.update_leader(database.cursor(), id, leader_id, name)
+        database.commit()
 
         self.status_message_signal.emit('Data Edited')
       except Exception as e:
@@ -284,10 +341,8 @@ class LeaderModel(QAbstractTableModel):
 
   def add_leader(self, leader_id, name):
     try:
-      cursor.execute("""INSERT INTO leaders(leaderId, name) VALUES(?, ?)""",
-                     (leader_id, name,))
-
-      connection.commit()
+      scheduler_db.add_leader(database.cursor(), leader_id, name)
+      database.commit()
 
       self.update()
     except Exception as e:
@@ -296,10 +351,9 @@ class LeaderModel(QAbstractTableModel):
 
   def delete_leader(self, selection):
     try:
-      for index in selection:
-        id = self.model_data[index.row()][0]
-        cursor.execute('''DELETE FROM leaders WHERE id = %d''' % (id))
-      connection.commit()
+      ids = [self.model_data[index.row()][0] for index in selection]
+      scheduler_db.delete_leaders(database.cursor(), ids)
+      database.commit()
 
       self.update()
     except Exception as e:
@@ -308,15 +362,9 @@ class LeaderModel(QAbstractTableModel):
         'Fail to delete leader %s: %s' % (str(ids), str(e)))
 
 
-def check_enough_staff_per_day(day_schedule, required):
-  num = 0
-  for s in day_schedule:
-    if s not in unavailable:
-      num += 1
-  return num >= required
-
-
 def to_df(data, current_date, first_day, days_in_month):
+  import pandas as pd
+
   df_data = {
     'ID': [row[0][1] if i >= 4 else '' for i, row in enumerate(data)],
     'Name': [row[0][2] if i >= 4 else '' for i, row in enumerate(data)],
@@ -338,11 +386,12 @@ def to_df(data, current_date, first_day, days_in_month):
 
 
 def from_df(df):
-  cursor.execute("""SELECT * FROM staffs;""")
-  staffs = cursor.fetchall()
+  import pandas as pd
 
-  cursor.execute("""SELECT * FROM leaders;""")
-  leaders = cursor.fetchall()
+  staffs = scheduler_db.load_staffs(database.cursor())
+  leaders = scheduler_db.load_leaders(database.cursor())
+  staff_index = scheduler_engine.StaffIndex(staffs)
+  leader_index = scheduler_engine.StaffIndex(leaders)
 
   data = []
   for i, row in enumerate(df.values):
@@ -360,11 +409,9 @@ def from_df(df):
       leader_name = row[2]
 
       leader = [0, leader_id, leader_name]
-
-      for l in leaders:
-        if l[2] == leader_name:
-          leader = [c for c in l]
-          break
+      position = leader_index.find(leader)
+      if position is not None:
+        leader = [c for c in leaders[position]]
 
       row_data = [leader]
       for item in row[3:]:
@@ -382,10 +429,9 @@ def from_df(df):
       staff_name = row[2]
 
       staff = [0, staff_id, staff_name, shift_types[1]]
-      for s in staffs:
-        if s[2] == staff_name:
-          staff = [c for c in s]
-          break
+      position = staff_index.find(staff)
+      if position is not None:
+        staff = [c for c in staffs[position]]
 
       row_data = [staff]
       for item in row[3:]:
@@ -414,8 +460,11 @@ class RequestModel(QAbstractTableModel):
     self.current_date = current_date
     self.first_day, self.days_in_month = monthrange(current_date.year,
                                                     current_date.month)
+    self.headers = day_headers(current_date, self.first_day,
+                               self.days_in_month)
     self.load_data()
 
+  @timed('load_data')
   def load_data(self):
     """
     data should look like this
@@ -426,73 +475,14 @@ class RequestModel(QAbstractTableModel):
     """
 
     self.beginResetModel()
-    cursor.execute("""SELECT * FROM staffs;""")
-    staffs = cursor.fetchall()
-
-    cursor.execute("""SELECT * FROM leaders;""")
-    leaders = cursor.fetchall()
-
-    cursor.execute("""SELECT data FROM requests
-                   WHERE year = %d and month = %d""" %
-                   (self.current_date.year, self.current_date.month))
-    data = cursor.fetchall()
-    if len(data) > 0:
-      self.model_data = json.loads(data[0][0])
-
-      # find leader
-      self.leader = [0, 0, 'Unknown']
-      if len(leaders) > 0:
-        self.model_data[4][0] = leaders[-1]
-        self.leader = leaders[-1]
-      else:
-        self.model_data[4][0] = self.leader
-
-      # refresh staffs
-      staff_model_data = []
-      for staff in staffs:
-        found = False
-        for s in range(5, len(self.model_data)):
-          if self.model_data[s][0][2] == staff[2]:
-            staff_model_data.append([staff] + self.model_data[s][1:])
-            found = True
-        if not found:
-          staff_model_data.append([staff, ''] + ['' for _ in range(self.days_in_month)] + [0])
-
-      self.model_data = self.model_data[:5] + staff_model_data
-    else:
-      self.model_data = []
+    staffs = scheduler_db.load_staffs(database.cursor())
+    leaders = scheduler_db.load_leaders(database.cursor())
 
-      # insert scheduled days off
-      days_off = ['Days off', '']
-      for d in range(self.days_in_month):
-        if (d + self.first_day) % 7 in [5, 6]:
-          days_off.append(True)
-        else:
-          days_off.append(False)
-      days_off.append(0)
-      self.model_data.append(days_off)
-
-      # insert extra staff options
-      row_data = [night_shift, ''] + [2 for _ in range(self.days_in_month)] + ['']
-      self.model_data.append(row_data)
-      row_data = [day_shift, ''] + [4 for _ in range(self.days_in_month)] + ['']
-      self.model_data.append(row_data)
-      row_data = [evening_shift, ''] + [3 for _ in range(self.days_in_month)] + ['']
-      self.model_data.append(row_data)
-
-      # insert leader
-      self.leader = None
-      if len(leaders) > 0:
-        self.leader = leaders[0]
-        row_data = [self.leader, ''] + ['' for _ in range(self.days_in_month)] + [0]
-      else:
-        row_data = [[0, 0, 'Unknown'], ''] + ['' for _ in range(self.days_in_month)] + [0]
-      self.model_data.append(row_data)
-
-      # insert staff
-      for staff in staffs:
-        row_data = [staff, ''] + ['' for _ in range(self.days_in_month)] + [0]
-        self.model_data.append(row_data)
+    request_data = load_month('requests', self.current_date.year,
+                              self.current_date.month)
+    self.model_data = scheduler_engine.prepare_request_data(
+      request_data, staffs, leaders, self.first_day, self.days_in_month)
+    self.leader = self.model_data[4][0]
 
     self.save()
     self.update_states()
@@ -504,34 +494,12 @@ class RequestModel(QAbstractTableModel):
       - check if each day should have enough staff for work
       - compute the total number day off each staff should have
       - compute the total day off that each staff request
+
+    this recounts the whole grid, single edits update self.coverage instead
     """
 
-    # each day should have enough staff for work
-    self.enough = [[True for _ in range(self.days_in_month+3)]
-                         for _ in range(len(self.model_data))]
-
-    for day in range(2, self.days_in_month+2):
-      day_schedule = [self.model_data[s][day] for s in range(4, len(self.model_data))]
-      total_staff = self.model_data[1][day] + self.model_data[2][day] + \
-        self.model_data[3][day]
-      if not check_enough_staff_per_day(day_schedule, total_staff):
-        for i in range(4, len(self.model_data)):
-          self.enough[i][day] = False
-
-    # compute total number of day off
-    total_day_off = 0
-    for day in range(2, self.days_in_month+2):
-      if self.model_data[0][day]:
-        total_day_off += 1
-    self.model_data[0][-1] = total_day_off
-
-    # compute total requested day off for each staff
-    for s in range(4, len(self.model_data)):
-      total_day_off = 0
-      for day in range(2, self.days_in_month+2):
-        if self.model_data[s][day] in unavailable:
-          total_day_off += 1
-      self.model_data[s][-1] = total_day_off
+    self.coverage = scheduler_engine.RequestCoverage(self.model_data,
+                                                     self.days_in_month)
 
   def update_shift_count(self, day):
     """
@@ -551,43 +519,38 @@ class RequestModel(QAbstractTableModel):
       self.model_data[2][day] = day_shift_count
       self.model_data[3][day] = evening_shift_count
 
-  def save(self):
-    try:
-      cursor.execute("""SELECT data FROM requests
-                    WHERE year = %d and month = %d""" %
-                    (self.current_date.year, self.current_date.month))
-      data = cursor.fetchall()
-      json_data = json.dumps(self.model_data)
-
-      if len(data) > 0:
-        cursor.execute("""UPDATE requests set data = '%s'
-                       WHERE year = %d and month = %d""" %
-                       (json_data, self.current_date.year, self.current_date.month))
-      else:
-        cursor.execute("""INSERT INTO requests(year, month, data)
-                       VALUES(?, ?, ?)""", (self.current_date.year,
-                                            self.current_date.month,
-                                            json_data))
-      connection.commit()
-    except Exception as e:
-      self.status_message_signal.emit(str(e))
+  def save(self, cells=None):
+    """
+    queue the whole month, or only the edited (row, column) cells, for saving
+    """
+
+    write_behind.save('requests', self.current_date.year,
+                      self.current_date.month, self.model_data, cells)
 
   def set_values(self, selection, value):
-    self.beginResetModel()
-    updated = False
+    cells = []
     for index in selection:
       if index.row() > 4 and \
           index.column() > 1 and index.column() <= self.days_in_month+1:
+        old_value = self.model_data[index.row()][index.column()]
         self.model_data[index.row()][index.column()] = value
-        updated = True
+        self.coverage.update_cell(index.row(), index.column(), old_value)
+        cells.append((index.row(), index.column()))
+    updated = len(cells) > 0
 
     if updated:
-      self.update_states()
-      self.save()
-
-    self.endResetModel()
+      self.save(cells)
+
+      # availability is shown on the whole day column, totals on each row
+      last_row = self.rowCount(0) - 1
+      last_col = self.columnCount(0) - 1
+      for col in sorted(set(col for _, col in cells)):
+        emit_data_changed(self, 0, col, last_row, col)
+      for row in sorted(set(row for row, _ in cells)):
+        emit_data_changed(self, row, last_col, row, last_col)
     return updated
 
+  @timed('export')
   def export_json(self, filepath):
     obj = {
       'year': self.current_date.year,
@@ -602,16 +565,19 @@ class RequestModel(QAbstractTableModel):
     except Exception:
       return False
 
+  @timed('export')
   def export_csv(self, filepath):
     df = to_df(self.model_data, self.current_date,
                self.first_day, self.days_in_month)
     df.to_csv(filepath)
 
+  @timed('export')
   def export_excel(self, filepath):
     df = to_df(self.model_data, self.current_date,
                self.first_day, self.days_in_month)
     df.to_excel(filepath)
 
+  @timed('import')
   def import_json(self, filepath):
     with open(filepath) as f:
       obj = json.load(f)
@@ -632,9 +598,9 @@ class RequestModel(QAbstractTableModel):
           return False
 
     self.status_message_signal.emit('import success')
-    self.beginResetModel()
     self.model_data = new_model_data
-    self.endResetModel()
+    self.update_states()
+    emit_data_changed(self, 0, 0, self.rowCount(0)-1, self.columnCount(0)-1)
     self.save()
     return True
 
@@ -656,20 +622,25 @@ class RequestModel(QAbstractTableModel):
             return False
 
       self.status_message_signal.emit('import success')
-      self.beginResetModel()
       self.model_data = new_model_data
       self.update_states()
-      self.endResetModel()
+      emit_data_changed(self, 0, 0, self.rowCount(0)-1, self.columnCount(0)-1)
       self.save()
       return True
     except Exception:
       self.status_message_signal.emit('fail to import data')
 
+  @timed('import')
   def import_csv(self, filepath):
+    import pandas as pd
+
     df = pd.read_csv(filepath)
     self.import_df(df)
 
+  @timed('import')
   def import_excel(self, filepath):
+    import pandas as pd
+
     df = pd.read_excel(filepath)
     self.import_df(df)
 
@@ -699,23 +670,11 @@ class RequestModel(QAbstractTableModel):
         if index.column() == 0:
           offset = 5
           if index.row() >= offset:
-            if self.model_data[index.row()][0][3] == shift_types[0]:
-              return color1
-            elif self.model_data[index.row()][0][3] == shift_types[2]:
-              return color2
+            return preference_brushes.get(self.model_data[index.row()][0][3])
         else:
-          if self.model_data[index.row()][index.column()] == day_off1:
-            return color3
-          elif self.model_data[index.row()][index.column()] == day_off2:
-            return color3
-          elif self.model_data[index.row()][index.column()] == business_travel:
-            return color3
-          elif self.model_data[index.row()][index.column()] == night_shift:
-            return color1
-          elif self.model_data[index.row()][index.column()] == evening_shift:
-            return color2
+          return code_brushes.get(self.model_data[index.row()][index.column()])
     elif role == Qt.ForegroundRole:
-      if not self.enough[index.row()][index.column()]:
+      if not self.coverage.is_enough(index.row(), index.column()):
         return color4
     return None
 
@@ -723,6 +682,7 @@ class RequestModel(QAbstractTableModel):
     changed = False
     if role == Qt.EditRole:
       if index.column() > 0 and index.column() <= self.days_in_month:
+        old_value = self.model_data[index.row()][index.column()]
         if index.row() == 0:
           self.model_data[index.row()][index.column()] = value
           changed = True
@@ -745,25 +705,25 @@ class RequestModel(QAbstractTableModel):
           if index.row() == 4 and \
               index.column() >= 1 and index.column() <= self.days_in_month:
             self.update_shift_count(index.column())
+            self.coverage.update_day(index.column())
 
     if changed:
-      self.update_states()
-      self.save()
+      self.coverage.update_cell(index.row(), index.column(), old_value)
+      cells = [(index.row(), index.column())]
+      if index.row() == 4:
+        cells += [(r, index.column()) for r in range(1, 4)]
+      self.save(cells)
+
+      last_col = self.columnCount(0) - 1
+      emit_data_changed(self, 0, index.column(), self.rowCount(0)-1, index.column())
+      emit_data_changed(self, 0, last_col, 0, last_col)
+      emit_data_changed(self, index.row(), last_col, index.row(), last_col)
     return changed
 
   def headerData(self, col, orientation, role):
     if role == Qt.DisplayRole:
       if orientation == Qt.Horizontal:
-        day_text = ['一', '二', '三', '四', '五', '六', '日']
-        if col == 0:
-          return 'Name'
-        elif col == 1:
-          return 'Limit'
-        elif col > 1 and col <= self.days_in_month+1:
-          text = day_text[(self.first_day + col - 2) % len(day_text)]
-          return '%d/%d\n%s' % (self.current_date.month, col-1, text)
-        else:
-          return 'Total'
+        return self.headers[col]
       elif orientation == Qt.Vertical:
         if col == 0:
           return 'off'
@@ -797,15 +757,33 @@ class AsyncTask(QThread):
 class ScheduleModel(QAbstractTableModel):
   status_message_signal = pyqtSignal(str)
   set_optimize_status_signal = pyqtSignal(str)
+  # emitted from the solver thread, delivered on the gui thread
+  optimize_result_signal = pyqtSignal(object, object)
+  profile_changed_signal = pyqtSignal(str)
+  # improving solutions, emitted from the solver thread
+  progress_signal = pyqtSignal(object, object)
 
   def __init__(self, parent, current_date):
     super(ScheduleModel, self).__init__(parent)
 
     self.parent = parent
+    self.optimize_result_signal.connect(self.apply_result)
+    self.progress_signal.connect(self.show_progress)
+    self.live_update = False
+    self.bold_font = QFont()
+    self.bold_font.setBold(True)
+    self.profile = default_profile
     self.set_current_date(current_date)
     self.work_day_constrain = 7
     self.day_off_constrain = 1
 
+  def set_live_update(self, state):
+    """
+    show every improving roster while the solver is running
+    """
+
+    self.live_update = bool(state)
+
   def set_work_day_constrain(self, constrain):
     try:
       self.work_day_constrain = int(constrain)
@@ -818,27 +796,41 @@ class ScheduleModel(QAbstractTableModel):
     except Exception:
       pass
 
+  def set_profile(self, profile):
+    """
+    choose the solver profile, it is saved with the month's schedule
+    """
+
+    if profile not in profile_names or profile == self.profile:
+      return
+    self.profile = profile
+    try:
+      scheduler_db.save_profile(database.cursor(), self.current_date.year,
+                                self.current_date.month, profile)
+      database.commit()
+    except Exception as e:
+      self.status_message_signal.emit('Fail to save solver profile: %s' % str(e))
+
   def set_current_date(self, current_date):
     self.current_date = current_date
     self.first_day, self.days_in_month = monthrange(current_date.year,
                                                     current_date.month)
+    self.headers = day_headers(current_date, self.first_day,
+                               self.days_in_month)
     self.load_data()
 
   def load_staffs(self):
-    cursor.execute("""SELECT * FROM staffs;""")
-    self.staffs = cursor.fetchall()
+    self.staffs = scheduler_db.load_staffs(database.cursor())
 
   def load_request(self):
-    cursor.execute("""SELECT data FROM requests
-                   WHERE year = %d and month = %d;""" %
-                   (self.current_date.year, self.current_date.month))
-    data = cursor.fetchall()
-
-    if len(data) > 0:
-      self.preference_data = json.loads(data[0][0])
+    data = load_month('requests', self.current_date.year,
+                      self.current_date.month)
+    if data is not None:
+      self.preference_data = data
     else:
       self.status_message_signal.emit('Request not set yet')
 
+  @timed('load_data')
   def load_data(self):
     """
     load the data if exists from db
@@ -849,71 +841,26 @@ class ScheduleModel(QAbstractTableModel):
     self.load_staffs()
     self.load_request()
 
-    cursor.execute("""SELECT * FROM schedules
-                   WHERE year = %d and month = %d;""" %
-                   (self.current_date.year, self.current_date.month))
-    data = cursor.fetchall()
-    if len(data) > 0:
-      self.schedule_data = json.loads(data[0][3])
-
-      # copy leader's shift
-      for day in range(2, self.days_in_month+2):
-        if self.preference_data[4][day]:
-          self.schedule_data[4][day] = self.preference_data[4][day]
-        else:
-          self.schedule_data[4][day] = day_shift
-      self.schedule_data[4][0] = self.preference_data[4][0]
-
-      # refresh staff members
-      staff_model_data = []
-      for staff in self.staffs:
-        found = False
-        for s in range(5, len(self.schedule_data)):
-          if self.schedule_data[s][0][2] == staff[2]:
-            staff_model_data.append([staff] + self.schedule_data[s][1:])
-            found = True
-        if not found:
-          staff_model_data.append([staff, ''] + ['' for _ in range(self.days_in_month)] + [0])
-
-      self.schedule_data = self.schedule_data[:5] + staff_model_data
-
-      # copy the staff requirment and staff required shift type
-      for i in range(4):
-        for j in range(2, self.columnCount(0)):
-          self.schedule_data[i][j] = self.preference_data[i][j]
-
-      for i in range(5, len(self.schedule_data)):
-        self.schedule_data[i][1] = self.preference_data[i][1]
-    else:
-      # direct copy from preference data
-      self.schedule_data = []
-      for row in self.preference_data:
-        r = [col for col in row]
-        self.schedule_data.append(r)
+    schedule_data = load_month('schedules', self.current_date.year,
+                               self.current_date.month)
+    self.schedule_data = scheduler_engine.prepare_schedule_data(
+      schedule_data, self.preference_data, self.staffs, self.days_in_month)
+    self.profile = scheduler_db.load_profile(
+      database.cursor(), self.current_date.year,
+      self.current_date.month) or default_profile
+    self.changed_cells = set()
 
     self.highlight()
     self.endResetModel()
+    self.profile_changed_signal.emit(self.profile)
 
-  def save(self):
-    try:
-      cursor.execute("""SELECT data FROM schedules
-                    WHERE year = %d and month = %d""" %
-                    (self.current_date.year, self.current_date.month))
-      data = cursor.fetchall()
-      json_data = json.dumps(self.schedule_data)
-
-      if len(data) > 0:
-        cursor.execute("""UPDATE schedules set data = '%s'
-                       WHERE year = %d and month = %d""" %
-                       (json_data, self.current_date.year, self.current_date.month))
-      else:
-        cursor.execute("""INSERT INTO schedules(year, month, data)
-                       VALUES(?, ?, ?)""", (self.current_date.year,
-                                            self.current_date.month,
-                                            json_data))
-      connection.commit()
-    except Exception as e:
-      self.status_message_signal.emit(str(e))
+  def save(self, cells=None):
+    """
+    queue the whole month, or only the edited (row, column) cells, for saving
+    """
+
+    write_behind.save('schedules', self.current_date.year,
+                      self.current_date.month, self.schedule_data, cells)
 
   def load_previous_month_data(self):
     """
@@ -925,235 +872,171 @@ class ScheduleModel(QAbstractTableModel):
                      day=1)
     last_month = first - timedelta(days=1)
 
-    cursor.execute("""SELECT * FROM schedules
-                   WHERE year = %d and month = %d;""" %
-                   (last_month.year, last_month.month))
-    data = cursor.fetchall()
-    if len(data) > 0:
-      self.last_month_data = json.loads(data[0][3])
-
-  def prev_month_schedule_last_few_days(self, staffs):
-    constrain_days = self.work_day_constrain-1
-    prev_data = {s: [0 for _ in range(constrain_days)] for s in staffs}
-    if hasattr(self, 'last_month_data'):
-      for name in staffs:
-        # find the staff
-        for s in range(5, len(self.last_month_data)):
-          if self.last_month_data[s][0][2] == name:
-            row_schedule = [col for col in self.last_month_data[s][-1-constrain_days:-1]]
-            cummulative_count = 0
-            for j, col in enumerate(row_schedule[::-1]):
-              if col not in unavailable:
-                cummulative_count += 1
-              prev_data[name][-(j+1)] = cummulative_count
-    return prev_data
+    self.last_month_data = load_month('schedules', last_month.year,
+                                      last_month.month)
 
   def optimize_asyn(self):
+    self.start_solver(self.optimize)
+
+  def repair_asyn(self, days=()):
+    """
+    re-solve around the cells edited since the last optimization
+    and the selected days only
+    """
+
+    cells = sorted(self.changed_cells)
+    days = [day for day in days if 2 <= day < self.days_in_month+2]
+    if not cells and not days:
+      self.status_message_signal.emit('Edit a shift or select days to repair')
+      return
+    self.start_solver(lambda *args: self.repair(*args, cells=cells, days=days))
+
+  def extend_asyn(self, seconds=30):
+    """
+    search for some more seconds, starting from the current roster
+    """
+
+    profile = scheduler_engine.get_profile(self.profile).extended(seconds)
+    # an earlier extension of the same inputs is cached, search again
+    self.start_solver(lambda *args: self.optimize(*args, cache=False), profile)
+
+  def stop(self):
+    """
+    stop the running search, the best roster so far is kept
+    """
+
+    if self.is_solving():
+      self.control.stop()
+      self.status_message_signal.emit('Stopping, keeping the best roster...')
+
+  def is_solving(self):
+    return hasattr(self, 'task') and not self.task.isFinished()
+
+  def start_solver(self, solve, profile=None):
     self.load_previous_month_data()
-    if hasattr(self, 'task') and not self.task.isFinished():
+    if self.is_solving():
       self.status_message_signal.emit('Optimization is still running...')
     else:
-      self.task = AsyncTask(self.parent, self.optimize_sync)
+      # the solver thread works on a copy of the month and its settings,
+      # the model is only changed on the gui thread once the result comes
+      # back, so switching month while solving does not mix two months
+      current_date = self.current_date
+      days_in_month = self.days_in_month
+      constrains = (self.work_day_constrain, self.day_off_constrain)
+      last_month_data = self.last_month_data
+      if profile is None:
+        profile = self.profile
+      live_update = self.live_update
+      control = scheduler_engine.SolveControl()
+      self.control = control
+      schedule_data = [list(row) for row in self.schedule_data]
+      preference_data = [list(row) for row in self.preference_data]
+      self.task = AsyncTask(self.parent,
+                            lambda: solve(current_date, schedule_data,
+                                          preference_data, days_in_month,
+                                          constrains, last_month_data,
+                                          profile, live_update, control))
       self.task.setTerminationEnabled(True)
-      self.task.finished.connect(self.save)
       self.task.start()
 
-  def optimize_sync(self):
-    self.beginResetModel()
-    self.optimize()
-    self.update_state()
-    self.endResetModel()
-
-  def optimize(self):
+  def optimize(self, current_date, schedule_data, preference_data,
+               days_in_month, constrains, last_month_data,
+               profile=default_profile, live_update=False, control=None,
+               cache=True):
     """
     optimize using CP-SAT model from google
+    runs on the solver thread, unchanged inputs reuse the cached result
+    constrains is (work_day_constrain, day_off_constrain)
     """
 
     self.status_message_signal.emit('start optimization...')
-    model = cp_model.CpModel()
-
-    shifts = {}
-
-    # add variables
-    num_shifts = 3
-    staffs = []
-    for s in range(5, len(self.schedule_data)):
-      staff = self.schedule_data[s][0][2]
-      staffs.append(staff)
-      for day in range(2, self.days_in_month+2):
-        for n in range(num_shifts):
-          shifts[(staff, day, n)] = model.NewBoolVar(
-            'shift_staff%s_day%d_shift%d' % (staff, day, n))
-
-    # each day should have the required number of staff for work
-    for day in range(2, self.days_in_month+2):
-      for n in range(num_shifts):
-        total = sum(shifts[(staff, day, n)] for staff in staffs)
-        model.Add(total >= self.schedule_data[n+1][day])
-
-    # every staff should only work when there are at least 16 hour
-    # in between each shift
-    for staff in staffs:
-      for day in range(2, self.days_in_month+2):
-        model.Add(sum(shifts[(staff, day, n)] for n in range(num_shifts)) <= 1)
-
-        if day < self.days_in_month:
-          model.Add(shifts[(staff, day, 1)] + shifts[(staff, day, 2)] + shifts[(staff, day+1, 0)] <= 1)
-          model.Add(shifts[(staff, day, 2)] + shifts[(staff, day+1, 0)] + shifts[(staff, day+1, 1)] <= 1)
-
-    preference_shift_count = 16
-    for s in range(5, len(self.schedule_data)):
-      staff = self.schedule_data[s][0][2]
-      staff_pref = self.schedule_data[s][0][3]
-
-      total = sum(shifts[(staff, day, n)]
-                  for day in range(2, self.days_in_month+2)
-                  for n in range(3))
-      model.Add(total <= self.days_in_month)
-
-      # if this staff prefer night shift or evening shift
-      # this staff should have at least 16 that kind of shift for this month
-      if staff_pref == shift_types[0]:
-        total = sum(shifts[(staff, day, 0)] for day in range(2, self.days_in_month+2))
-        model.Add(total >= preference_shift_count)
-      elif staff_pref == shift_types[2]:
-        total = sum(shifts[(staff, day, 2)] for day in range(2, self.days_in_month+2))
-        model.Add(total >= preference_shift_count)
-        #  model.Maximize(total)
-
-    # for a number days of work, each staff should have at least some days off
-    for start_day in range(2, self.days_in_month+2-self.work_day_constrain):
-      for staff in staffs:
-        total = sum(shifts[(staff, day, n)]
-                    for day in range(start_day, start_day+self.work_day_constrain)
-                    for n in range(num_shifts))
-        model.Add(total <= self.work_day_constrain-self.day_off_constrain)
-
-    # also check the work days from previous month
-    prev_month_data = self.prev_month_schedule_last_few_days(staffs)
-    for num_day in range(1, self.work_day_constrain):
-      for staff in staffs:
-        already_working = prev_month_data[staff][num_day-1]
-        total = sum(shifts[(staff, day, n)]
-                    for day in range(2, 2+num_day)
-                    for n in range(num_shifts))
-        model.Add(total <= self.work_day_constrain-self.day_off_constrain-already_working)
-
-    # staff should not be working
-    # when business travel is scheduled
-    for s in range(5, len(self.preference_data)):
-      staff = self.schedule_data[s][0][2]
-      for day in range(2, self.days_in_month+2):
-        if self.preference_data[s][day] == business_travel:
-          model.Add(sum(shifts[(staff, day, n)] for n in range(num_shifts)) == 0)
-
-    # every staff should have at least the same number of day off
-    # as the number of saturday and sunday plus
-    # the number of national holiday
-    total_number_day_off_required = self.preference_data[0][-1]
-    num_work_days = self.days_in_month-total_number_day_off_required
-    for s in range(5, len(self.preference_data)):
-      staff = self.schedule_data[s][0][2]
-      model.Add(sum(shifts[(staff, day, n)]
-                    for day in range(2, self.days_in_month+2)
-                    for n in range(num_shifts)) <= num_work_days)
-
-    # if this staff is limited to the type of shift
-    # only give the staff that shift
-    for s in range(5, len(self.preference_data)):
-      limited_shift = self.schedule_data[s][1]
-      if limited_shift:
-        #  print(staff, self.schedule_data[s][1])
-        staff = self.schedule_data[s][0][2]
-        if limited_shift == night_shift:
-          model.Add(sum(shifts[(staff, day, 1)]
-                        for day in range(2, self.days_in_month+2)) == 0)
-          model.Add(sum(shifts[(staff, day, 2)]
-                        for day in range(2, self.days_in_month+2)) == 0)
-        elif limited_shift == day_shift:
-          model.Add(sum(shifts[(staff, day, 0)]
-                        for day in range(2, self.days_in_month+2)) == 0)
-          model.Add(sum(shifts[(staff, day, 2)]
-                        for day in range(2, self.days_in_month+2)) == 0)
-        elif limited_shift == evening_shift:
-          model.Add(sum(shifts[(staff, day, 0)]
-                        for day in range(2, self.days_in_month+2)) == 0)
-          model.Add(sum(shifts[(staff, day, 1)]
-                        for day in range(2, self.days_in_month+2)) == 0)
-
-    # optimization objective
-    # try to satisfy the request made by staffs
-    objective = 0
-    for s in range(5, len(self.preference_data)):
-      staff = self.schedule_data[s][0][2]
-      for day in range(2, self.days_in_month+2):
-        if self.preference_data[s][day] in [day_off1, day_off2]:
-          objective += sum(shifts[(staff, day, n)] for n in range(num_shifts))
-        elif self.preference_data[s][day] == night_shift:
-          objective += shifts[(staff, day, 1)] + shifts[(staff, day, 2)]
-        elif self.preference_data[s][day] == day_shift:
-          objective += shifts[(staff, day, 0)] + shifts[(staff, day, 2)]
-        elif self.preference_data[s][day] == evening_shift:
-          objective += shifts[(staff, day, 0)] + shifts[(staff, day, 1)]
-
-      if self.schedule_data[s][0][3] == shift_types[0]:
-        objective += sum(shifts[(staff, day, 1)]
-                         for day in range(2, self.days_in_month+2))
-        objective += sum(shifts[(staff, day, 2)]
-                         for day in range(2, self.days_in_month+2))
-
-      if self.schedule_data[s][0][3] == shift_types[2]:
-        objective += sum(shifts[(staff, day, 0)]
-                         for day in range(2, self.days_in_month+2))
-        objective += sum(shifts[(staff, day, 1)]
-                         for day in range(2, self.days_in_month+2))
-    model.Minimize(objective)
-
-    # solve
-    solver = cp_model.CpSolver()
-    solver.parameters.linearization_level = 0
-    solver.parameters.max_time_in_seconds = 20.0
-
-    status = solver.Solve(model)
-    self.set_optimize_status_signal.emit(solver.StatusName(status))
-
-    #  print(solver.ObjectiveValue())
 
-    try:
-      for s in range(5, len(self.schedule_data)):
-        staff = self.schedule_data[s][0][2]
-        for day in range(2, self.days_in_month+2):
-          if solver.Value(shifts[(staff, day, 0)]):
-            self.schedule_data[s][day] = night_shift
-          elif solver.Value(shifts[(staff, day, 1)]):
-            self.schedule_data[s][day] = day_shift
-          elif solver.Value(shifts[(staff, day, 2)]):
-            self.schedule_data[s][day] = evening_shift
-          else:
-            # setting day off
-            if self.preference_data[s][day] == business_travel:
-              self.schedule_data[s][day] = business_travel
-            elif self.preference_data[s][day] == day_off1:
-              self.schedule_data[s][day] = day_off1
-            elif self.preference_data[s][day] == day_off2:
-              self.schedule_data[s][day] = day_off2
-            else:
-              self.schedule_data[s][day] = day_off1
-
-      #  for s in range(5, len(self.preference_data)):
-      #    staff = self.schedule_data[s][0][2]
-      #    for day in range(2, self.days_in_month+2):
-      #      if self.preference_data[s][day] in [day_off1, day_off2]:
-      #        if solver.Value(shifts[(staff, day, 0)]) != 0 or \
-      #            solver.Value(shifts[(staff, day, 1)]) != 0 or \
-      #            solver.Value(shifts[(staff, day, 2)]) != 0:
-      #          self.diff[s][day] = True
-    except Exception:
-      pass
+    def on_progress(progress):
+      self.progress_signal.emit(current_date, progress)
+
+    work_day_constrain, day_off_constrain = constrains
+    result = scheduler_engine.solve(schedule_data, preference_data,
+                                    days_in_month, work_day_constrain,
+                                    day_off_constrain, last_month_data,
+                                    profile, on_progress=on_progress,
+                                    live_rows=live_update, control=control,
+                                    cache=cache)
+    self.set_optimize_status_signal.emit(result.status)
+    self.status_message_signal.emit(result.statistics())
+    self.optimize_result_signal.emit(current_date, result)
+
+  def repair(self, current_date, schedule_data, preference_data,
+             days_in_month, constrains, last_month_data,
+             profile=default_profile, live_update=False, control=None,
+             cells=(), days=()):
+    """
+    localized re-optimization, runs on the solver thread
+    """
+
+    self.status_message_signal.emit('start repair...')
+
+    def on_progress(progress):
+      self.progress_signal.emit(current_date, progress)
+
+    work_day_constrain, day_off_constrain = constrains
+    result = scheduler_engine.repair(schedule_data, preference_data,
+                                     days_in_month, cells, days,
+                                     work_day_constrain, day_off_constrain,
+                                     last_month_data,
+                                     profile, on_progress=on_progress,
+                                     live_rows=live_update, control=control)
+    self.set_optimize_status_signal.emit(result.status)
+    if result.has_solution():
+      changes = scheduler_engine.count_changes(schedule_data, result.rows,
+                                               days_in_month)
+      self.status_message_signal.emit('%d shifts changed, %s' % (
+        changes, result.statistics()))
+    else:
+      self.status_message_signal.emit(result.statistics())
+    self.optimize_result_signal.emit(current_date, result)
 
-    message = 'Statistics: conflicts: %d, branches: %d, wall time: %f' % (
-      solver.NumConflicts(), solver.NumBranches(), solver.WallTime())
-    self.status_message_signal.emit(message)
+  def show_progress(self, current_date, progress):
+    self.status_message_signal.emit(progress.message())
+    if progress.rows is not None:
+      self.apply_rows(current_date, progress.rows)
+
+  def apply_result(self, current_date, result):
+    if result.has_solution() and self.apply_rows(current_date, result.rows):
+      self.changed_cells = set()
+      self.save()
+
+  def apply_rows(self, current_date, rows):
+    """
+    copy the solved shifts into the schedule and repaint
+    only the staff rows and days that changed
+    """
+
+    # ignore the rows if another month was loaded in the meantime
+    if current_date != self.current_date or \
+        len(rows) != len(self.schedule_data) - 5:
+      return False
+
+    old_data = [list(row) for row in self.schedule_data]
+    scheduler_engine.apply_solution(self.schedule_data, rows,
+                                    self.days_in_month)
+    self.update_state()
+
+    changed_rows = set()
+    changed_days = set()
+    for s in range(4, len(self.schedule_data)):
+      for col in range(1, self.columnCount(0)):
+        if old_data[s][col] != self.schedule_data[s][col]:
+          changed_rows.add(s)
+          changed_days.add(col)
+
+    last_row = self.rowCount(0) - 1
+    last_col = self.columnCount(0) - 1
+    for row in sorted(changed_rows):
+      emit_data_changed(self, row, 0, row, last_col)
+    # the over coverage highlight depends on every staff of that day
+    for col in sorted(changed_days):
+      emit_data_changed(self, 0, col, last_row, col)
+    return True
 
   def update_state(self):
     """
@@ -1161,19 +1044,7 @@ class ScheduleModel(QAbstractTableModel):
     and fill in the empty cell as day shift for leader row
     """
 
-    # update days off
-    for s in range(5, len(self.schedule_data)):
-      num_days_off = 0
-      for day in range(2, self.days_in_month+2):
-        if self.schedule_data[s][day] in unavailable:
-          num_days_off += 1
-      self.schedule_data[s][-1] = num_days_off
-
-    # update leader
-    for day in range(2, self.days_in_month+2):
-      if self.schedule_data[4][day] == '':
-        self.schedule_data[4][day] = day_shift
-
+    scheduler_engine.update_totals(self.schedule_data, self.days_in_month)
     self.highlight()
 
   def highlight(self):
@@ -1181,50 +1052,14 @@ class ScheduleModel(QAbstractTableModel):
     create highlight if
       - green: the requested day off is not given
       - bold: the day has more than enough staff for the kind of shift
+
+    this recounts the whole schedule, single edits update self.highlights
     """
 
-    self.diff = [[False for _ in range(self.columnCount(0))]
-                  for s in range(len(self.schedule_data))]
-
-    for s in range(5, len(self.preference_data)):
-      for day in range(2, self.days_in_month+2):
-        if self.preference_data[s][day] in [day_off1, day_off2]:
-          if self.schedule_data[s][day] not in [day_off1, day_off2]:
-            self.diff[s][day] = True
-
-    self.more = [[False for _ in range(self.columnCount(0))]
-                 for s in range(len(self.schedule_data))]
-    for day in range(2, self.days_in_month+2):
-      required_night_shift = self.schedule_data[1][day]
-      required_day_shift = self.schedule_data[2][day]
-      required_evening_shift = self.schedule_data[3][day]
-
-      night_shift_count = 0
-      day_shift_count = 0
-      evening_shift_count = 0
-      for s in range(5, len(self.schedule_data)):
-        if self.schedule_data[s][day] == night_shift:
-          night_shift_count += 1
-        elif self.schedule_data[s][day] == day_shift:
-          day_shift_count += 1
-        elif self.schedule_data[s][day] == evening_shift:
-          evening_shift_count += 1
-
-      if night_shift_count > required_night_shift:
-        for s in range(5, len(self.schedule_data)):
-          if self.schedule_data[s][day] == night_shift:
-            self.more[s][day] = True
-
-      if day_shift_count > required_day_shift:
-        for s in range(5, len(self.schedule_data)):
-          if self.schedule_data[s][day] == day_shift:
-            self.more[s][day] = True
-
-      if evening_shift_count > required_evening_shift:
-        for s in range(5, len(self.schedule_data)):
-          if self.schedule_data[s][day] == evening_shift:
-            self.more[s][day] = True
+    self.highlights = scheduler_engine.ScheduleHighlight(
+      self.schedule_data, self.preference_data, self.days_in_month)
 
+  @timed('export')
   def export_json(self, filepath):
     obj = {
       'year': self.current_date.year,
@@ -1239,16 +1074,19 @@ class ScheduleModel(QAbstractTableModel):
     except Exception:
       return False
 
+  @timed('export')
   def export_csv(self, filepath):
     df = to_df(self.schedule_data, self.current_date,
                self.first_day, self.days_in_month)
     df.to_csv(filepath)
 
+  @timed('export')
   def export_excel(self, filepath):
     df = to_df(self.schedule_data, self.current_date,
                self.first_day, self.days_in_month)
     df.to_excel(filepath)
 
+  @timed('import')
   def import_json(self, filepath):
     with open(filepath) as f:
       obj = json.load(f)
@@ -1298,20 +1136,25 @@ class ScheduleModel(QAbstractTableModel):
             return False
 
       self.status_message_signal.emit('import success')
-      self.beginResetModel()
       self.schedule_data = new_model_data
       self.update_state()
-      self.endResetModel()
+      emit_data_changed(self, 0, 0, self.rowCount(0)-1, self.columnCount(0)-1)
       self.save()
       return True
     except Exception:
       self.status_message_signal.emit('fail to import data')
 
+  @timed('import')
   def import_csv(self, filepath):
+    import pandas as pd
+
     df = pd.read_csv(filepath)
     self.import_df(df)
 
+  @timed('import')
   def import_excel(self, filepath):
+    import pandas as pd
+
     df = pd.read_excel(filepath)
     self.import_df(df)
 
@@ -1333,66 +1176,54 @@ class ScheduleModel(QAbstractTableModel):
       leader_offset = 4
       staff_offset = 5
       if index.row() >= leader_offset:
-        if index.row() >= staff_offset and index.column() == 0:
-          if self.staffs[index.row()-staff_offset][-1] == shift_types[0]:
-            return color1
-          elif self.staffs[index.row()-staff_offset][-1] == shift_types[2]:
-            return color2
-
-        if self.schedule_data[index.row()][index.column()] == day_off1:
-          return color3
-        elif self.schedule_data[index.row()][index.column()] == day_off2:
-          return color3
-        elif self.schedule_data[index.row()][index.column()] == business_travel:
-          return color3
-        elif self.schedule_data[index.row()][index.column()] == night_shift:
-          return color1
-        elif self.schedule_data[index.row()][index.column()] == evening_shift:
-          return color2
+        if index.column() == 0:
+          if index.row() >= staff_offset:
+            return preference_brushes.get(
+              self.staffs[index.row()-staff_offset][-1])
+        else:
+          return code_brushes.get(self.schedule_data[index.row()][index.column()])
       elif index.row() == 1:
         return color1
       elif index.row() == 3:
         return color2
     elif role == Qt.ForegroundRole:
-      if index.row() >= 5:
-        if self.diff[index.row()][index.column()]:
-          return color5
+      if self.highlights.is_denied(index.row(), index.column()):
+        return color5
     elif role == Qt.FontRole:
       if index.row() >= 5:
-        bold_font = QFont()
-        bold_font.setBold(True)
-        if self.more[index.row()][index.column()]:
-          return bold_font
-        if self.diff[index.row()][index.column()]:
-          return bold_font
+        if self.highlights.is_more(index.row(), index.column()):
+          return self.bold_font
+        if self.highlights.is_denied(index.row(), index.column()):
+          return self.bold_font
     elif role == Qt.TextAlignmentRole:
       return Qt.AlignCenter
     return None
 
   def setData(self, index, value, role):
     if role == Qt.EditRole:
+      old_value = self.schedule_data[index.row()][index.column()]
       if isinstance(value, str):
         self.schedule_data[index.row()][index.column()] = value.upper()
       else:
         self.schedule_data[index.row()][index.column()] = value
+      self.highlights.update_cell(index.row(), index.column(), old_value)
+      if index.row() >= scheduler_engine.staff_offset and \
+          2 <= index.column() < self.days_in_month+2:
+        self.changed_cells.add((index.row(), index.column()))
 
-      self.save()
+      # the other staffs on this day may gain or lose their highlight
+      top = self.index(0, index.column())
+      bottom = self.index(self.rowCount(0)-1, index.column())
+      self.dataChanged.emit(top, bottom)
+
+      self.save([(index.row(), index.column())])
       return True
     return False
 
   def headerData(self, col, orientation, role):
     if role == Qt.DisplayRole:
       if orientation == Qt.Horizontal:
-        day_text = ['一', '二', '三', '四', '五', '六', '日']
-        if col == 0:
-          return 'Name'
-        elif col == 1:
-          return 'Limit'
-        elif col > 1 and col <= self.days_in_month+1:
-          text = day_text[(self.first_day + col - 2) % len(day_text)]
-          return '%d/%d\n%s' % (self.current_date.month, col-1, text)
-        else:
-          return 'Total'
+        return self.headers[col]
     return None
 
   def flags(self, index):
@@ -1411,6 +1242,8 @@ class MainWindow(QMainWindow, Ui_MainWindow):
 
     self.tab_widget.currentChanged.connect(self.handle_tab_change)
 
+    write_behind.status_message_signal.connect(self.show_status_message)
+
     # staffs tab
     self.staff_preference_combobox.addItems(shift_types)
     self.staff_preference_combobox.setCurrentIndex(1)
@@ -1470,6 +1303,17 @@ class MainWindow(QMainWindow, Ui_MainWindow):
       self.set_optimize_status)
     self.load_schedule_button.clicked.connect(self.load_schedule)
     self.schedule_button.clicked.connect(self.schedule_model.optimize_asyn)
+    self.repair_button.clicked.connect(self.repair_schedule)
+    self.stop_button.clicked.connect(self.schedule_model.stop)
+    self.extend_button.clicked.connect(
+      lambda: self.schedule_model.extend_asyn(30))
+    self.live_update_checkbox.stateChanged.connect(
+      self.schedule_model.set_live_update)
+    self.solver_profile_combobox.addItems(profile_names)
+    self.set_solver_profile(self.schedule_model.profile)
+    self.schedule_model.profile_changed_signal.connect(self.set_solver_profile)
+    self.solver_profile_combobox.currentTextChanged.connect(
+      self.schedule_model.set_profile)
     self.work_day_constrain.textChanged.connect(self.schedule_model.set_work_day_constrain)
     self.day_off_constrain.textChanged.connect(self.schedule_model.set_day_off_contrain)
     self.export_schedule_button.clicked.connect(self.export_schedule)
@@ -1610,6 +1454,14 @@ class MainWindow(QMainWindow, Ui_MainWindow):
     except Exception as e:
       self.show_error(str(e))
 
+  def repair_schedule(self):
+    selection = self.schedule_view.selectionModel().selectedIndexes()
+    days = sorted(set(index.column() for index in selection))
+    self.schedule_model.repair_asyn(days)
+
+  def set_solver_profile(self, profile):
+    self.solver_profile_combobox.setCurrentIndex(profile_names.index(profile))
+
   def set_optimize_status(self, text):
     self.optimize_status.setText(text)
     if text == 'OPTIMAL':
@@ -1700,7 +1552,9 @@ class MainWindow(QMainWindow, Ui_MainWindow):
 
 
 def main():
+  scheduler_timing.enable_from_environment()
   app = QApplication(sys.argv)
+  init_db()
   app.aboutToQuit.connect(close_db)
   main_window = MainWindow()
   #  main_window.show()
@@ -0,0 +1,567 @@
+"""
+command line entry point for the headless scheduler
+
+  python scheduler_cli.py solve --year 2026 --month 11 --db db.sqlite3
+  python scheduler_cli.py repair --year 2026 --month 11 --days 10-13
+  python scheduler_cli.py plan --year 2026 --month 11 --months 3 --horizon 2
+  python scheduler_cli.py batch --year 2026 --month 11 ward1.sqlite3 ward2.sqlite3
+  python scheduler_cli.py migrate --db db.sqlite3
+
+--timings summary.json before the command writes how long each phase
+took, see scheduler_timing
+"""
+
+import os
+import sys
+import argparse
+import concurrent.futures
+from datetime import datetime, timedelta
+from calendar import monthrange
+
+import scheduler_db
+import scheduler_engine
+import scheduler_timing
+
+
+def previous_month(year, month):
+  last_month = datetime(year=year, month=month, day=1) - timedelta(days=1)
+  return last_month.year, last_month.month
+
+
+def next_month(year, month):
+  if month == 12:
+    return year+1, 1
+  return year, month+1
+
+
+def load_month_data(cursor, year, month, require_request=True):
+  """
+  the schedule, preference and last month's schedule of a month
+  prepared the same way the schedule tab does
+
+  without require_request a month with no request gets the empty
+  request the request tab starts from
+  """
+
+  first_day, days_in_month = monthrange(year, month)
+
+  request_data = scheduler_db.load_month(cursor, 'requests', year, month)
+  if request_data is None and require_request:
+    raise ValueError('Request not set yet for %d/%d' % (year, month))
+
+  staffs = scheduler_db.load_staffs(cursor)
+  leaders = scheduler_db.load_leaders(cursor)
+  preference_data = scheduler_engine.prepare_request_data(
+    request_data, staffs, leaders, first_day, days_in_month)
+  if request_data is None:
+    # the request tab counts the days off when it is edited
+    preference_data[0][-1] = sum(
+      1 for value in preference_data[0][2:days_in_month+2] if value)
+
+  schedule_data = scheduler_db.load_month(cursor, 'schedules', year, month)
+  schedule_data = scheduler_engine.prepare_schedule_data(
+    schedule_data, preference_data, staffs, days_in_month)
+
+  last_year, last_month = previous_month(year, month)
+  last_month_data = scheduler_db.load_month(cursor, 'schedules',
+                                            last_year, last_month)
+  return schedule_data, preference_data, last_month_data
+
+
+def solve_month(connection, year, month,
+                work_day_constrain=7, day_off_constrain=1, profile=None,
+                warm_start=True, on_progress=None, time_limit=None,
+                encoding=scheduler_engine.default_encoding,
+                symmetry_breaking=False):
+  """
+  schedule a month stored in the database and save the result
+  the same way the schedule tab does
+
+  without a profile the one saved for the month is used,
+  with warm_start the saved schedule seeds the search,
+  on_progress gets every improving solution as it is found,
+  time_limit overrides the profile's time limit in seconds
+  """
+
+  cursor = connection.cursor()
+  _, days_in_month = monthrange(year, month)
+  schedule_data, preference_data, last_month_data = load_month_data(
+    cursor, year, month)
+
+  if profile is None:
+    profile = scheduler_db.load_profile(cursor, year, month) or \
+      scheduler_engine.default_profile
+  if time_limit is not None:
+    profile = scheduler_engine.get_profile(profile).extended(time_limit)
+
+  result = scheduler_engine.solve(schedule_data, preference_data,
+                                  days_in_month, work_day_constrain,
+                                  day_off_constrain, last_month_data, profile,
+                                  warm_start, on_progress,
+                                  encoding=encoding,
+                                  symmetry_breaking=symmetry_breaking)
+  save_result(connection, year, month, schedule_data, result)
+  return result
+
+
+def repair_month(connection, year, month, days,
+                 work_day_constrain=7, day_off_constrain=1, profile=None,
+                 on_progress=None, encoding=scheduler_engine.default_encoding):
+  """
+  re-solve the given days of the month (1 based), keeping the
+  rest of the saved schedule
+
+  returns the result and the number of shifts changed
+  """
+
+  cursor = connection.cursor()
+  _, days_in_month = monthrange(year, month)
+  outside = [day for day in days if not 1 <= day <= days_in_month]
+  if outside:
+    raise ValueError('%d/%d has no day %s' % (
+      year, month, ', '.join(str(day) for day in outside)))
+  schedule_data, preference_data, last_month_data = load_month_data(
+    cursor, year, month)
+
+  if profile is None:
+    profile = scheduler_db.load_profile(cursor, year, month) or \
+      scheduler_engine.default_profile
+
+  result = scheduler_engine.repair(schedule_data, preference_data,
+                                   days_in_month, days=[day+1 for day in days],
+                                   work_day_constrain=work_day_constrain,
+                                   day_off_constrain=day_off_constrain,
+                                   last_month_data=last_month_data,
+                                   profile=profile, on_progress=on_progress,
+                                   encoding=encoding)
+  changes = 0
+  if result.has_solution():
+    changes = scheduler_engine.count_changes(schedule_data, result.rows,
+                                             days_in_month)
+  save_result(connection, year, month, schedule_data, result)
+  return result, changes
+
+
+def plan_months(connection, year, month, num_months, horizon=2,
+                work_day_constrain=7, day_off_constrain=1, profile=None,
+                on_progress=None, encoding=scheduler_engine.default_encoding):
+  """
+  schedule num_months months one after another, each solved together
+  with the next horizon-1 months but only the first one saved, so the
+  end of a month is planned knowing the start of the next one
+
+  the saved month is the last month of the next solve, and the rows
+  found for the later months seed it when it has no saved schedule yet
+
+  returns (year, month, result) for every saved month
+  """
+
+  cursor = connection.cursor()
+  # every saved month needs a request, check before saving any of them
+  y, m = year, month
+  for _ in range(num_months):
+    if scheduler_db.load_month(cursor, 'requests', y, m) is None:
+      raise ValueError('Request not set yet for %d/%d' % (y, m))
+    y, m = next_month(y, m)
+
+  results = []
+  lookahead = {}
+  for _ in range(num_months):
+    window = [(year, month)]
+    for _ in range(horizon-1):
+      window.append(next_month(*window[-1]))
+
+    months = []
+    last_month_data = None
+    for i, (y, m) in enumerate(window):
+      _, days_in_month = monthrange(y, m)
+      schedule_data, preference_data, last_data = load_month_data(
+        cursor, y, m, require_request=i == 0)
+      if i == 0:
+        last_month_data = last_data
+      if (y, m) in lookahead and \
+          scheduler_db.load_month(cursor, 'schedules', y, m) is None:
+        scheduler_engine.apply_solution(schedule_data, lookahead[(y, m)],
+                                        days_in_month)
+      months.append((schedule_data, preference_data, days_in_month))
+
+    month_profile = profile
+    if month_profile is None:
+      month_profile = scheduler_db.load_profile(cursor, year, month) or \
+        scheduler_engine.default_profile
+
+    result = scheduler_engine.solve_horizon(months, work_day_constrain,
+                                            day_off_constrain,
+                                            last_month_data, month_profile,
+                                            on_progress=on_progress,
+                                            encoding=encoding)
+    save_result(connection, year, month, months[0][0], result)
+    results.append((year, month, result))
+    if not result.has_solution():
+      break
+
+    lookahead = dict(zip(window[1:], result.lookahead))
+    year, month = next_month(year, month)
+  return results
+
+
+def solve_ward(db, year, month, work_day_constrain=7, day_off_constrain=1,
+               profile=None, cpus=1, time_limit=None,
+               encoding=scheduler_engine.default_encoding):
+  """
+  solve_month for one ward database, run in a batch worker process
+
+  returns (db, result, error), error is the message when the month
+  could not be scheduled at all, e.g. without a request or when the
+  database cannot be read, so one ward never stops the others
+  """
+
+  connection = None
+  try:
+    connection = scheduler_db.connect(db)
+    cursor = connection.cursor()
+    if profile is None:
+      profile = scheduler_db.load_profile(cursor, year, month) or \
+        scheduler_engine.default_profile
+    profile = scheduler_engine.get_profile(profile).with_workers(cpus)
+    if time_limit is not None:
+      profile = profile.extended(time_limit)
+    result = solve_month(connection, year, month, work_day_constrain,
+                         day_off_constrain, profile, encoding=encoding)
+    return db, result, None
+  except ValueError as e:
+    return db, None, str(e)
+  except Exception as e:
+    return db, None, '%s: %s' % (type(e).__name__, str(e))
+  finally:
+    if connection is not None:
+      connection.close()
+
+
+def solve_wards(dbs, year, month, work_day_constrain=7, day_off_constrain=1,
+                profile=None, cpus=None, time_limit=None,
+                encoding=scheduler_engine.default_encoding, on_done=None):
+  """
+  schedule the same month for many ward databases at once
+
+  every ward gets cpus solver workers and at most time_limit seconds
+  (the profile's limit by default), as many wards as the cores allow
+  run together in separate processes. the results are saved to each
+  ward's database the same way the schedule tab does
+
+  on_done gets (db, result, error) as each ward finishes, the same
+  tuples are returned in the order of dbs, a database given twice
+  is only solved once
+  """
+
+  unique = []
+  seen = set()
+  for db in dbs:
+    path = os.path.realpath(db)
+    if path not in seen:
+      seen.add(path)
+      unique.append(db)
+  dbs = unique
+
+  num_cores = scheduler_engine.num_cores
+  if cpus is None:
+    cpus = min(4, num_cores)
+  cpus = max(1, min(cpus, num_cores))
+  max_workers = max(1, min(len(dbs), num_cores // cpus))
+
+  results = {}
+  with concurrent.futures.ProcessPoolExecutor(max_workers) as executor:
+    futures = dict((executor.submit(solve_ward, db, year, month,
+                                    work_day_constrain, day_off_constrain,
+                                    profile, cpus, time_limit, encoding), db)
+                   for db in dbs)
+    for future in concurrent.futures.as_completed(futures):
+      db = futures[future]
+      try:
+        _, result, error = future.result()
+      except Exception as e:
+        # e.g. the worker process died
+        result, error = None, '%s: %s' % (type(e).__name__, str(e))
+      results[db] = (db, result, error)
+      if on_done is not None:
+        on_done(db, result, error)
+  return [results[db] for db in dbs]
+
+
+def save_result(connection, year, month, schedule_data, result):
+  cursor = connection.cursor()
+  _, days_in_month = monthrange(year, month)
+  if result.has_solution():
+    scheduler_engine.apply_solution(schedule_data, result.rows, days_in_month)
+  scheduler_engine.update_totals(schedule_data, days_in_month)
+
+  with scheduler_timing.phase('save'):
+    scheduler_db.save_month(cursor, 'schedules', year, month, schedule_data)
+    scheduler_db.save_profile(cursor, year, month, result.profile)
+    connection.commit()
+
+
+def print_progress(progress):
+  print(progress.message(), file=sys.stderr)
+
+
+def solve_command(args):
+  connection = scheduler_db.connect(args.db)
+  try:
+    result = solve_month(connection, args.year, args.month,
+                         args.work_day_constrain, args.day_off_constrain,
+                         args.profile, args.warm_start,
+                         print_progress if args.progress else None,
+                         args.time_limit, args.encoding,
+                         args.symmetry_breaking)
+  except ValueError as e:
+    print(str(e), file=sys.stderr)
+    return 1
+  finally:
+    connection.close()
+
+  print(result.status)
+  print(result.statistics())
+  return 0 if result.has_solution() else 2
+
+
+def parse_days(text):
+  """
+  days of month given as 5, 5-8 or 5,7-8
+  """
+
+  days = []
+  try:
+    for part in text.split(','):
+      first, _, last = part.partition('-')
+      first, last = int(first), int(last or first)
+      if first < 1 or last < first:
+        raise ValueError(part)
+      days.extend(range(first, last+1))
+  except ValueError:
+    raise argparse.ArgumentTypeError('invalid days: %s' % text)
+  return days
+
+
+def repair_command(args):
+  connection = scheduler_db.connect(args.db)
+  try:
+    result, changes = repair_month(connection, args.year, args.month,
+                                   args.days, args.work_day_constrain,
+                                   args.day_off_constrain, args.profile,
+                                   print_progress if args.progress else None,
+                                   args.encoding)
+  except ValueError as e:
+    print(str(e), file=sys.stderr)
+    return 1
+  finally:
+    connection.close()
+
+  print(result.status)
+  print(result.statistics())
+  if result.has_solution():
+    print('%d shifts changed' % changes)
+  return 0 if result.has_solution() else 2
+
+
+def plan_command(args):
+  connection = scheduler_db.connect(args.db)
+  try:
+    results = plan_months(connection, args.year, args.month, args.months,
+                          args.horizon, args.work_day_constrain,
+                          args.day_off_constrain, args.profile,
+                          print_progress if args.progress else None,
+                          args.encoding)
+  except ValueError as e:
+    print(str(e), file=sys.stderr)
+    return 1
+  finally:
+    connection.close()
+
+  for year, month, result in results:
+    print('%d/%d %s' % (year, month, result.status))
+    print(result.statistics())
+  return 0 if all(result.has_solution() for _, _, result in results) else 2
+
+
+def read_wards(path):
+  """
+  ward databases listed one per line, blank lines and # comments skipped,
+  relative paths are relative to the list
+  """
+
+  folder = os.path.dirname(path)
+  dbs = []
+  with open(path) as f:
+    for line in f:
+      line = line.split('#', 1)[0].strip()
+      if line:
+        dbs.append(os.path.join(folder, line))
+  return dbs
+
+
+def batch_command(args):
+  dbs = list(args.dbs)
+  if args.wards:
+    dbs.extend(read_wards(args.wards))
+  if not dbs:
+    print('no ward databases given', file=sys.stderr)
+    return 1
+  missing = [db for db in dbs if not os.path.exists(db)]
+  if missing:
+    print('ward database not found: %s' % ', '.join(missing), file=sys.stderr)
+    return 1
+
+  def print_done(db, result, error):
+    if error is not None:
+      print('%s: %s' % (db, error))
+    else:
+      print('%s: %s' % (db, result.status))
+      print(result.statistics())
+    sys.stdout.flush()
+
+  results = solve_wards(dbs, args.year, args.month, args.work_day_constrain,
+                        args.day_off_constrain, args.profile, args.cpus,
+                        args.time_limit, args.encoding, print_done)
+  failed = [db for db, result, error in results
+            if error is not None or not result.has_solution()]
+  print('%d of %d wards scheduled' % (len(results)-len(failed), len(results)))
+  return 0 if not failed else 2
+
+
+def migrate_command(args):
+  connection = scheduler_db.connect(args.db)
+  try:
+    scheduler_db.migrate_to_normalized(connection)
+  finally:
+    connection.close()
+  print('migrated %s to the normalized schema' % args.db)
+  return 0
+
+
+def parse_args(argv):
+  parser = argparse.ArgumentParser(prog='scheduler')
+  parser.add_argument('--timings', metavar='PATH',
+                      help='write the time spent in each phase as json')
+  parser.add_argument('--timings-log', metavar='PATH',
+                      help='log every phase to a rotating log')
+  parser.add_argument('--timings-memory', action='store_true',
+                      help='also trace memory, slows everything down')
+  subparsers = parser.add_subparsers(dest='command')
+  subparsers.required = True
+
+  solve_parser = subparsers.add_parser('solve', help='schedule a month')
+  solve_parser.add_argument('--year', type=int, required=True)
+  solve_parser.add_argument('--month', type=int, required=True,
+                            choices=range(1, 13))
+  solve_parser.add_argument('--db', default='db.sqlite3')
+  solve_parser.add_argument('--work-day-constrain', type=int, default=7)
+  solve_parser.add_argument('--day-off-constrain', type=int, default=1)
+  solve_parser.add_argument('--profile',
+                            choices=scheduler_engine.profile_names,
+                            help='solver profile, defaults to the one saved '
+                                 'for the month or %s' %
+                                 scheduler_engine.default_profile)
+  solve_parser.add_argument('--no-warm-start', dest='warm_start',
+                            action='store_false',
+                            help='do not start from the saved schedule')
+  solve_parser.add_argument('--progress', action='store_true',
+                            help='print every improving solution to stderr')
+  solve_parser.add_argument('--time-limit', type=float,
+                            help='seconds to search instead of the profile '
+                                 'time limit, the saved schedule is the '
+                                 'starting point')
+  solve_parser.add_argument('--encoding', choices=scheduler_engine.encodings,
+                            default=scheduler_engine.default_encoding,
+                            help='how the rest and work day rules are '
+                                 'given to the solver')
+  solve_parser.add_argument('--symmetry-breaking', action='store_true',
+                            help='order the rosters of staffs with the same '
+                                 'preference, limit, requests and carry over')
+  solve_parser.set_defaults(func=solve_command)
+
+  repair_parser = subparsers.add_parser(
+    'repair', help='re-solve some days, keeping the rest of the schedule')
+  repair_parser.add_argument('--year', type=int, required=True)
+  repair_parser.add_argument('--month', type=int, required=True,
+                             choices=range(1, 13))
+  repair_parser.add_argument('--days', type=parse_days, required=True,
+                             help='days of month, e.g. 10-13 or 3,10-13')
+  repair_parser.add_argument('--db', default='db.sqlite3')
+  repair_parser.add_argument('--work-day-constrain', type=int, default=7)
+  repair_parser.add_argument('--day-off-constrain', type=int, default=1)
+  repair_parser.add_argument('--profile',
+                             choices=scheduler_engine.profile_names)
+  repair_parser.add_argument('--progress', action='store_true',
+                             help='print every improving solution to stderr')
+  repair_parser.add_argument('--encoding', choices=scheduler_engine.encodings,
+                             default=scheduler_engine.default_encoding)
+  repair_parser.set_defaults(func=repair_command)
+
+  plan_parser = subparsers.add_parser(
+    'plan', help='schedule months one by one, each looking at the next ones')
+  plan_parser.add_argument('--year', type=int, required=True)
+  plan_parser.add_argument('--month', type=int, required=True,
+                           choices=range(1, 13))
+  plan_parser.add_argument('--months', type=int, default=1,
+                           help='number of months to schedule and save')
+  plan_parser.add_argument('--horizon', type=int, default=2, choices=[1, 2, 3],
+                           help='months solved together, only the first '
+                                'one is saved')
+  plan_parser.add_argument('--db', default='db.sqlite3')
+  plan_parser.add_argument('--work-day-constrain', type=int, default=7)
+  plan_parser.add_argument('--day-off-constrain', type=int, default=1)
+  plan_parser.add_argument('--profile',
+                           choices=scheduler_engine.profile_names)
+  plan_parser.add_argument('--progress', action='store_true',
+                           help='print every improving solution to stderr')
+  plan_parser.add_argument('--encoding', choices=scheduler_engine.encodings,
+                           default=scheduler_engine.default_encoding)
+  plan_parser.set_defaults(func=plan_command)
+
+  batch_parser = subparsers.add_parser(
+    'batch', help='schedule a month for many ward databases at once')
+  batch_parser.add_argument('dbs', nargs='*', metavar='db',
+                            help='ward databases')
+  batch_parser.add_argument('--wards',
+                            help='file listing ward databases, one per line')
+  batch_parser.add_argument('--year', type=int, required=True)
+  batch_parser.add_argument('--month', type=int, required=True,
+                            choices=range(1, 13))
+  batch_parser.add_argument('--work-day-constrain', type=int, default=7)
+  batch_parser.add_argument('--day-off-constrain', type=int, default=1)
+  batch_parser.add_argument('--profile',
+                            choices=scheduler_engine.profile_names)
+  batch_parser.add_argument('--cpus', type=int,
+                            help='solver workers per ward, defaults to %d' %
+                                 min(4, scheduler_engine.num_cores))
+  batch_parser.add_argument('--time-limit', type=float,
+                            help='seconds per ward instead of the profile '
+                                 'time limit')
+  batch_parser.add_argument('--encoding', choices=scheduler_engine.encodings,
+                            default=scheduler_engine.default_encoding)
+  batch_parser.set_defaults(func=batch_command)
+
+  migrate_parser = subparsers.add_parser(
+    'migrate', help='store months as one row per cell instead of json blobs')
+  migrate_parser.add_argument('--db', default='db.sqlite3')
+  migrate_parser.set_defaults(func=migrate_command)
+  return parser.parse_args(argv)
+
+
+def main(argv=None):
+  args = parse_args(argv)
+  if args.timings or args.timings_log:
+    scheduler_timing.enable(args.timings, args.timings_log,
+                            args.timings_memory)
+  else:
+    scheduler_timing.enable_from_environment()
+
+  code = args.func(args)
+  if args.timings or args.timings_log:
+    print(scheduler_timing.format_summary(), file=sys.stderr)
+  return code
+
+
+if __name__ == '__main__':
+  sys.exit(main())
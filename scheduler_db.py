@@ -0,0 +1,443 @@
+"""
+sqlite storage shared by the gui and the headless scheduler
+
+months are stored either as one json blob per month in the requests and
+schedules tables, or, after migrate_to_normalized(), one row per cell:
+
+  month_days  | kind | year | month | day | day off | required staff |
+  assignments | kind | year | month | staff id | leader | day | shift |
+
+kind is the name of the blob table ('requests' or 'schedules') and day is
+the grid column - 1, so day 0 holds the staff's Limit column. empty cells
+are not stored. PRAGMA user_version records which layout is in use.
+"""
+
+import json
+import time
+import sqlite3
+import threading
+from calendar import monthrange
+
+from scheduler_timing import timed
+from scheduler_engine import night_shift, day_shift, evening_shift
+from scheduler_engine import unavailable
+from scheduler_engine import leader_offset
+
+
+blob_version = 0
+normalized_version = 1
+
+
+def create_tables(cursor):
+  cursor.execute("""CREATE TABLE IF NOT EXISTS staffs(
+                 id INTEGER PRIMARY KEY AUTOINCREMENT,
+                 staffId INTEGER,
+                 name TEXT NOT NULL,
+                 preference TEXT NOT NULL);""")
+  cursor.execute("""CREATE TABLE IF NOT EXISTS leaders(
+                 id INTEGER PRIMARY KEY AUTOINCREMENT,
+                 leaderId INTEGER,
+                 name TEXT NOT NULL);""")
+  cursor.execute("""CREATE TABLE IF NOT EXISTS requests(
+                 id INTEGER PRIMARY KEY AUTOINCREMENT,
+                 year INTEGER NOT NULL,
+                 month INTEGER NOT NULL,
+                 data TEXT NOT NULL);""")
+  cursor.execute("""CREATE TABLE IF NOT EXISTS schedules(
+                 id INTEGER PRIMARY KEY AUTOINCREMENT,
+                 year INTEGER NOT NULL,
+                 month INTEGER NOT NULL,
+                 data TEXT NOT NULL);""")
+  cursor.execute("""CREATE TABLE IF NOT EXISTS schedule_profiles(
+                 year INTEGER NOT NULL,
+                 month INTEGER NOT NULL,
+                 profile TEXT NOT NULL,
+                 PRIMARY KEY(year, month));""")
+  cursor.execute("""CREATE INDEX IF NOT EXISTS requests_year_month
+                 ON requests(year, month);""")
+  cursor.execute("""CREATE INDEX IF NOT EXISTS schedules_year_month
+                 ON schedules(year, month);""")
+
+
+def create_normalized_tables(cursor):
+  cursor.execute("""CREATE TABLE IF NOT EXISTS month_days(
+                 kind TEXT NOT NULL,
+                 year INTEGER NOT NULL,
+                 month INTEGER NOT NULL,
+                 day INTEGER NOT NULL,
+                 day_off INTEGER NOT NULL,
+                 night_shift INTEGER NOT NULL,
+                 day_shift INTEGER NOT NULL,
+                 evening_shift INTEGER NOT NULL,
+                 PRIMARY KEY(kind, year, month, day));""")
+  cursor.execute("""CREATE TABLE IF NOT EXISTS assignments(
+                 kind TEXT NOT NULL,
+                 year INTEGER NOT NULL,
+                 month INTEGER NOT NULL,
+                 staff_id INTEGER NOT NULL,
+                 leader INTEGER NOT NULL,
+                 day INTEGER NOT NULL,
+                 shift TEXT NOT NULL,
+                 PRIMARY KEY(kind, year, month, leader, staff_id, day));""")
+  cursor.execute("""CREATE INDEX IF NOT EXISTS assignments_staff
+                 ON assignments(staff_id, kind, year, month);""")
+
+
+def storage_version(cursor):
+  cursor.execute("""PRAGMA user_version;""")
+  return cursor.fetchone()[0]
+
+
+def connect(path='db.sqlite3', check_same_thread=True):
+  """
+  open the database in WAL mode so readers do not wait for writers
+
+  every query below uses a fixed parameterized sql text, so sqlite3's
+  statement cache can reuse the prepared statements
+  """
+
+  connection = sqlite3.connect(path, cached_statements=256,
+                               check_same_thread=check_same_thread)
+  cursor = connection.cursor()
+  cursor.execute("""PRAGMA journal_mode = WAL;""")
+  cursor.execute("""PRAGMA synchronous = NORMAL;""")
+  create_tables(cursor)
+  connection.commit()
+  return connection
+
+
+class Database(object):
+  """
+  one connection per thread to the same database file
+  """
+
+  def __init__(self, path='db.sqlite3'):
+    self.path = path
+    self.local = threading.local()
+    self.lock = threading.Lock()
+    self.connections = []
+    self.connection()
+
+  def connection(self):
+    connection = getattr(self.local, 'connection', None)
+    if connection is None:
+      # only used by this thread, but closed from the main thread on exit
+      connection = connect(self.path, check_same_thread=False)
+      self.local.connection = connection
+      with self.lock:
+        self.connections.append(connection)
+    return connection
+
+  def cursor(self):
+    return self.connection().cursor()
+
+  def commit(self):
+    self.connection().commit()
+
+  def close(self):
+    with self.lock:
+      for connection in self.connections:
+        connection.commit()
+        connection.close()
+      self.connections = []
+    self.local = threading.local()
+
+
+def load_staffs(cursor):
+  cursor.execute("""SELECT * FROM staffs;""")
+  return cursor.fetchall()
+
+
+def add_staff(cursor, staff_id, name, preference):
+  cursor.execute("""INSERT INTO staffs(staffId, name, preference)
+                 VALUES(?, ?, ?)""", (staff_id, name, preference))
+
+
+def update_staff(cursor, id, name, staff_id=None):
+  if staff_id is None:
+    cursor.execute("""UPDATE staffs SET name = ? WHERE id = ?""", (name, id))
+  else:
+    cursor.execute("""UPDATE staffs SET staffId = ?, name = ? WHERE id = ?""",
+                   (staff_id, name, id))
+
+
+def update_staff_preference(cursor, id, preference):
+  cursor.execute("""UPDATE staffs SET preference = ? WHERE id = ?""",
+                 (preference, id))
+
+
+def delete_staffs(cursor, ids):
+  cursor.executemany("""DELETE FROM staffs WHERE id = ?""",
+                     [(id,) for id in ids])
+
+
+def load_leaders(cursor):
+  cursor.execute("""SELECT * FROM leaders;""")
+  return cursor.fetchall()
+
+
+def add_leader(cursor, leader_id, name):
+  cursor.execute("""INSERT INTO leaders(leaderId, name) VALUES(?, ?)""",
+                 (leader_id, name))
+
+
+def update_leader(cursor, id, leader_id, name):
+  cursor.execute("""UPDATE leaders SET leaderId = ?, name = ? WHERE id = ?""",
+                 (leader_id, name, id))
+
+
+def delete_leaders(cursor, ids):
+  cursor.executemany("""DELETE FROM leaders WHERE id = ?""",
+                     [(id,) for id in ids])
+
+
+@timed('db_load')
+def load_month(cursor, table, year, month):
+  """
+  load the grid of a month from requests or schedules
+  returns None if the month is not saved yet
+  """
+
+  if storage_version(cursor) == normalized_version:
+    return load_month_cells(cursor, table, year, month)
+
+  cursor.execute("""SELECT data FROM %s WHERE year = ? and month = ?;""" %
+                 table, (year, month))
+  data = cursor.fetchall()
+  if len(data) > 0:
+    return json.loads(data[0][0])
+  return None
+
+
+def save_month(cursor, table, year, month, data):
+  if storage_version(cursor) == normalized_version:
+    save_month_cells(cursor, table, year, month, data)
+    return
+
+  cursor.execute("""SELECT id FROM %s WHERE year = ? and month = ?;""" %
+                 table, (year, month))
+  json_data = json.dumps(data)
+  if len(cursor.fetchall()) > 0:
+    cursor.execute("""UPDATE %s set data = ? WHERE year = ? and month = ?""" %
+                   table, (json_data, year, month))
+  else:
+    cursor.execute("""INSERT INTO %s(year, month, data) VALUES(?, ?, ?)""" %
+                   table, (year, month, json_data))
+
+
+def load_profile(cursor, year, month):
+  """
+  the solver profile chosen for a month, or None if not chosen yet
+  """
+
+  cursor.execute("""SELECT profile FROM schedule_profiles
+                 WHERE year = ? and month = ?;""", (year, month))
+  row = cursor.fetchone()
+  return row[0] if row is not None else None
+
+
+def save_profile(cursor, year, month, profile):
+  cursor.execute("""INSERT OR REPLACE INTO schedule_profiles VALUES(?, ?, ?)""",
+                 (year, month, profile))
+
+
+def save_cells(cursor, table, year, month, data, cells):
+  """
+  save the edited (row, column) cells of a month
+  only the normalized layout can write single cells,
+  the blob layout rewrites the whole month
+  """
+
+  if storage_version(cursor) != normalized_version:
+    save_month(cursor, table, year, month, data)
+    return
+
+  days = set()
+  for row, col in cells:
+    if col < 1 or col >= len(data[row]) - 1:
+      continue
+    if row < leader_offset:
+      if col >= 2:
+        days.add(col)
+    else:
+      save_assignment(cursor, table, year, month, data[row], row, col)
+
+  for col in sorted(days):
+    cursor.execute("""INSERT OR REPLACE INTO month_days VALUES(?, ?, ?, ?, ?, ?, ?, ?)""",
+                   month_day_values(table, year, month, data, col))
+
+
+def month_day_values(table, year, month, data, col):
+  return (table, year, month, col-1, int(bool(data[0][col])),
+          int(data[1][col] or 0), int(data[2][col] or 0), int(data[3][col] or 0))
+
+
+def save_assignment(cursor, table, year, month, row_data, row, col):
+  key = (table, year, month, row_data[0][0], int(row == leader_offset), col-1)
+  value = row_data[col]
+  if value == '' or value is None:
+    cursor.execute("""DELETE FROM assignments
+                   WHERE kind = ? and year = ? and month = ?
+                   and staff_id = ? and leader = ? and day = ?""", key)
+  else:
+    cursor.execute("""INSERT OR REPLACE INTO assignments VALUES(?, ?, ?, ?, ?, ?, ?)""",
+                   key + (str(value),))
+
+
+def save_month_cells(cursor, table, year, month, data):
+  cursor.execute("""DELETE FROM month_days
+                 WHERE kind = ? and year = ? and month = ?""", (table, year, month))
+  cursor.execute("""DELETE FROM assignments
+                 WHERE kind = ? and year = ? and month = ?""", (table, year, month))
+
+  last_col = len(data[0]) - 1
+  cursor.executemany("""INSERT INTO month_days VALUES(?, ?, ?, ?, ?, ?, ?, ?)""",
+                     [month_day_values(table, year, month, data, col)
+                      for col in range(2, last_col)])
+
+  values = []
+  for row in range(leader_offset, len(data)):
+    for col in range(1, last_col):
+      value = data[row][col]
+      if value != '' and value is not None:
+        values.append((table, year, month, data[row][0][0],
+                       int(row == leader_offset), col-1, str(value)))
+  cursor.executemany("""INSERT OR REPLACE INTO assignments VALUES(?, ?, ?, ?, ?, ?, ?)""",
+                     values)
+
+
+def load_month_cells(cursor, table, year, month):
+  cursor.execute("""SELECT day, day_off, night_shift, day_shift, evening_shift
+                 FROM month_days WHERE kind = ? and year = ? and month = ?
+                 ORDER BY day;""", (table, year, month))
+  days = cursor.fetchall()
+  if len(days) == 0:
+    return None
+
+  days_in_month = monthrange(year, month)[1]
+  data = [['Days off', ''] + [False for _ in range(days_in_month)] + [0],
+          [night_shift, ''] + [0 for _ in range(days_in_month)] + [''],
+          [day_shift, ''] + [0 for _ in range(days_in_month)] + [''],
+          [evening_shift, ''] + [0 for _ in range(days_in_month)] + ['']]
+  for day, day_off, night, day_count, evening in days:
+    data[0][day+1] = bool(day_off)
+    data[1][day+1] = night
+    data[2][day+1] = day_count
+    data[3][day+1] = evening
+  data[0][-1] = sum(1 for col in data[0][2:-1] if col)
+
+  cursor.execute("""SELECT staff_id, leader, day, shift FROM assignments
+                 WHERE kind = ? and year = ? and month = ?;""",
+                 (table, year, month))
+  cells = {}
+  leader_id = 0
+  for staff_id, leader, day, shift in cursor.fetchall():
+    if leader:
+      leader_id = staff_id
+    cells.setdefault((leader, staff_id), {})[day+1] = shift
+
+  leaders = load_leaders(cursor)
+  leader = leaders[-1] if len(leaders) > 0 else [0, 0, 'Unknown']
+  for l in leaders:
+    if l[0] == leader_id:
+      leader = l
+  grid_rows = [(leader, cells.get((1, leader_id), {}))]
+  for staff in load_staffs(cursor):
+    grid_rows.append((staff, cells.get((0, staff[0]), {})))
+
+  for person, row_cells in grid_rows:
+    row_data = [list(person)] + ['' for _ in range(days_in_month+1)] + [0]
+    for col, shift in row_cells.items():
+      row_data[col] = shift
+    row_data[-1] = sum(1 for col in row_data[2:-1] if col in unavailable)
+    data.append(row_data)
+  return data
+
+
+def migrate_to_normalized(connection):
+  """
+  copy every month from the json blobs into the normalized tables
+  the blobs are kept so older versions can still read the database
+  """
+
+  cursor = connection.cursor()
+  create_normalized_tables(cursor)
+  for table in ['requests', 'schedules']:
+    cursor.execute("""SELECT year, month, data FROM %s;""" % table)
+    for year, month, data in cursor.fetchall():
+      save_month_cells(cursor, table, year, month, json.loads(data))
+  cursor.execute("""PRAGMA user_version = %d;""" % normalized_version)
+  connection.commit()
+
+
+class SaveQueue(object):
+  """
+  collect edited months and write them in a single transaction
+
+  edits to the same month are merged, so a month is written once per
+  flush no matter how many cells changed in between
+  """
+
+  def __init__(self):
+    self.pending = {}
+
+  def add(self, table, year, month, data, cells=None):
+    """
+    queue a month for saving, cells is the list of edited (row, column)
+    cells or None to write the whole month
+    """
+
+    key = (table, year, month)
+    if key in self.pending:
+      pending_cells = self.pending[key][1]
+      if pending_cells is None or cells is None:
+        cells = None
+      else:
+        cells = pending_cells | set(cells)
+    elif cells is not None:
+      cells = set(cells)
+    self.pending[key] = (data, cells)
+
+  def __len__(self):
+    return len(self.pending)
+
+  @timed('save')
+  def flush(self, connection):
+    if len(self.pending) == 0:
+      return
+
+    pending, self.pending = self.pending, {}
+    cursor = connection.cursor()
+    try:
+      for (table, year, month), (data, cells) in pending.items():
+        if cells is None:
+          save_month(cursor, table, year, month, data)
+        else:
+          save_cells(cursor, table, year, month, data, sorted(cells))
+      connection.commit()
+    except Exception:
+      connection.rollback()
+      # keep the edits so the next flush can retry them
+      for key, value in pending.items():
+        self.pending.setdefault(key, value)
+      raise
+
+
+def close_database(database, queue, retries=3, retry_delay=0.5):
+  """
+  write the queued edits and close the database
+  a locked database is retried, if the edits still cannot be written
+  the error is raised after closing and they are left in the queue
+  """
+
+  try:
+    for attempt in range(retries):
+      try:
+        queue.flush(database.connection())
+        break
+      except sqlite3.OperationalError:
+        if attempt == retries-1:
+          raise
+        time.sleep(retry_delay)
+  finally:
+    database.close()
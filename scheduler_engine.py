@@ -0,0 +1,1512 @@
+"""
+headless scheduling engine
+
+builds the CP-SAT model from the request/schedule grids, solves it and
+decodes the result, without depending on PyQt5 or pandas
+
+grid layout (both request and schedule data):
+
+  row 0   | 'Days off' | ''     | True/False per day | total days off |
+  row 1-3 | shift      | ''     | required staff per day | ''         |
+  row 4   | leader     | ''     | leader shift per day   | total      |
+  row 5.. | staff      | limit  | shift per day          | total      |
+
+ortools is only imported once a model is built
+"""
+
+import os
+import copy
+import json
+import hashlib
+import threading
+
+import scheduler_timing
+from scheduler_timing import timed
+
+
+shift_types = ['大夜 (PH)',
+               '白班 (1~4)',
+               '小夜 (4N)']
+
+day_off1 = 'WW'
+day_off2 = 'FF'
+business_travel = 'SS'
+night_shift = 'PH'
+day_shift = 'DAY'
+evening_shift = '4N'
+staff_required = 9
+
+night_shift_count = 2
+evening_shift_count = 3
+day_shift_count = 4
+
+unavailable = [day_off1, day_off2, business_travel]
+
+num_shifts = 3
+leader_offset = 4
+staff_offset = 5
+
+# shift codes in the order of the solver's shift index
+shift_codes = [night_shift, day_shift, evening_shift]
+shift_index = {code: n for n, code in enumerate(shift_codes)}
+
+
+def new_staff_row(staff, days_in_month):
+  return [staff, ''] + ['' for _ in range(days_in_month)] + [0]
+
+
+class StaffIndex(object):
+  """
+  positions of staff records keyed by their database id
+
+  the name is only used as a fallback, for records without an id
+  (e.g. imported from a file) or rows whose staff no longer exists
+  """
+
+  def __init__(self, records):
+    self.ids = []
+    self.by_id = {}
+    self.by_name = {}
+    for position, record in enumerate(records):
+      self.ids.append(record[0])
+      if record[0]:
+        self.by_id.setdefault(record[0], position)
+      self.by_name.setdefault(record[2], position)
+
+  @classmethod
+  def from_grid(cls, data):
+    """
+    index of the staff rows of a grid, positions are relative to staff_offset
+    """
+
+    return cls([row[0] for row in data[staff_offset:]])
+
+  def find(self, record, known_ids=()):
+    """
+    returns the position of the record or None
+
+    known_ids are the ids that are matched by id elsewhere,
+    rows with those ids are never matched by name
+    """
+
+    position = self.by_id.get(record[0]) if record[0] else None
+    if position is not None:
+      return position
+
+    position = self.by_name.get(record[2])
+    if position is not None and self.ids[position] in known_ids:
+      return None
+    return position
+
+
+def refresh_staff_rows(data, staffs, days_in_month):
+  """
+  rows for the current staffs, reusing the rows already in the grid
+  """
+
+  index = StaffIndex.from_grid(data)
+  staff_ids = set(staff[0] for staff in staffs)
+  rows = []
+  for staff in staffs:
+    position = index.find(staff, staff_ids)
+    if position is not None:
+      rows.append([staff] + data[staff_offset+position][1:])
+    else:
+      rows.append(new_staff_row(staff, days_in_month))
+  return rows
+
+
+def prepare_request_data(request_data, staffs, leaders,
+                         first_day, days_in_month):
+  """
+  refresh a saved request grid with the latest staffs and leader
+  or create a new one if the month has no request yet
+  """
+
+  if request_data:
+    model_data = request_data
+
+    # find leader
+    if len(leaders) > 0:
+      model_data[leader_offset][0] = leaders[-1]
+    else:
+      model_data[leader_offset][0] = [0, 0, 'Unknown']
+
+    # refresh staffs
+    return model_data[:staff_offset] + \
+      refresh_staff_rows(model_data, staffs, days_in_month)
+
+  model_data = []
+
+  # insert scheduled days off
+  days_off = ['Days off', '']
+  for d in range(days_in_month):
+    if (d + first_day) % 7 in [5, 6]:
+      days_off.append(True)
+    else:
+      days_off.append(False)
+  days_off.append(0)
+  model_data.append(days_off)
+
+  # insert extra staff options
+  row_data = [night_shift, ''] + [night_shift_count for _ in range(days_in_month)] + ['']
+  model_data.append(row_data)
+  row_data = [day_shift, ''] + [day_shift_count for _ in range(days_in_month)] + ['']
+  model_data.append(row_data)
+  row_data = [evening_shift, ''] + [evening_shift_count for _ in range(days_in_month)] + ['']
+  model_data.append(row_data)
+
+  # insert leader
+  if len(leaders) > 0:
+    model_data.append(new_staff_row(leaders[0], days_in_month))
+  else:
+    model_data.append(new_staff_row([0, 0, 'Unknown'], days_in_month))
+
+  # insert staff
+  for staff in staffs:
+    model_data.append(new_staff_row(staff, days_in_month))
+  return model_data
+
+
+def prepare_schedule_data(schedule_data, preference_data, staffs,
+                          days_in_month):
+  """
+  refresh a saved schedule with the latest staffs and requests
+  or copy the requests if the month is not scheduled yet
+  """
+
+  if not schedule_data:
+    return [[col for col in row] for row in preference_data]
+
+  # copy leader's shift
+  for day in range(2, days_in_month+2):
+    if preference_data[leader_offset][day]:
+      schedule_data[leader_offset][day] = preference_data[leader_offset][day]
+    else:
+      schedule_data[leader_offset][day] = day_shift
+  schedule_data[leader_offset][0] = preference_data[leader_offset][0]
+
+  # refresh staff members
+  schedule_data = schedule_data[:staff_offset] + \
+    refresh_staff_rows(schedule_data, staffs, days_in_month)
+
+  # copy the staff requirment and staff required shift type
+  for i in range(leader_offset):
+    for j in range(2, days_in_month+3):
+      schedule_data[i][j] = preference_data[i][j]
+
+  for i in range(staff_offset, len(schedule_data)):
+    schedule_data[i][1] = preference_data[i][1]
+  return schedule_data
+
+
+def update_totals(schedule_data, days_in_month):
+  """
+  compute the number of days off for each staff
+  and fill in the empty cell as day shift for leader row
+  """
+
+  # update days off
+  for s in range(staff_offset, len(schedule_data)):
+    num_days_off = 0
+    for day in range(2, days_in_month+2):
+      if schedule_data[s][day] in unavailable:
+        num_days_off += 1
+    schedule_data[s][-1] = num_days_off
+
+  # update leader
+  for day in range(2, days_in_month+2):
+    if schedule_data[leader_offset][day] == '':
+      schedule_data[leader_offset][day] = day_shift
+
+
+class RequestCoverage(object):
+  """
+  per day count of available staff and per staff count of days off
+  for a request grid, kept up to date one edited cell at a time
+
+  the counts of staffs are written into the total column of the grid
+  """
+
+  def __init__(self, data, days_in_month):
+    self.data = data
+    self.days_in_month = days_in_month
+    self.rebuild()
+
+  @timed('update_states')
+  def rebuild(self):
+    """
+    recount everything from the grid
+    """
+
+    from scheduler_grid import Grid
+
+    data = self.data
+    grid = Grid.from_data(data, strict=False)
+
+    totals = grid.day_off_totals().tolist()
+    for s in range(leader_offset, len(data)):
+      data[s][-1] = totals[s-leader_offset]
+    data[0][-1] = int(grid.days_off.sum())
+
+    self.available = [0, 0] + grid.available().tolist() + [0]
+    self.enough = [True, True] + grid.enough().tolist() + [True]
+
+  def required(self, day):
+    return self.data[1][day] + self.data[2][day] + self.data[3][day]
+
+  def update_day(self, day):
+    """
+    recheck a day after its required number of staff changed
+    """
+
+    self.enough[day] = self.available[day] >= self.required(day)
+
+  def update_cell(self, row, col, old_value):
+    """
+    account for data[row][col] having changed from old_value
+    """
+
+    if col < 2 or col > self.days_in_month+1:
+      return
+
+    new_value = self.data[row][col]
+    if row == 0:
+      self.data[0][-1] += int(bool(new_value)) - int(bool(old_value))
+    elif row >= leader_offset:
+      was_off = old_value in unavailable
+      is_off = new_value in unavailable
+      if was_off != is_off:
+        delta = 1 if is_off else -1
+        self.data[row][-1] += delta
+        self.available[col] -= delta
+    self.update_day(col)
+
+  def is_enough(self, row, col):
+    return row < leader_offset or self.enough[col]
+
+  def consistent(self):
+    """
+    compare the running counts with a full recount
+    """
+
+    fresh = RequestCoverage([list(row) for row in self.data],
+                            self.days_in_month)
+    return fresh.available == self.available and \
+      fresh.enough == self.enough and \
+      [row[-1] for row in fresh.data] == [row[-1] for row in self.data]
+
+
+class ScheduleHighlight(object):
+  """
+  per day count of staffs on each shift for a schedule grid
+
+  a cell is highlighted if
+    - denied: the requested day off is not given
+    - more: the day has more than enough staff for the kind of shift
+  both are read from the counts, so a single edit only updates one day
+  """
+
+  def __init__(self, schedule_data, preference_data, days_in_month):
+    self.schedule_data = schedule_data
+    self.preference_data = preference_data
+    self.days_in_month = days_in_month
+    self.rebuild()
+
+  @timed('highlight')
+  def rebuild(self):
+    from scheduler_grid import Grid
+
+    counts = Grid.from_data(self.schedule_data, strict=False).shift_counts()
+    empty = [0 for _ in range(num_shifts)]
+    self.counts = [empty, empty] + counts.T.tolist() + [empty]
+
+  def update_cell(self, row, col, old_value):
+    """
+    account for schedule_data[row][col] having changed from old_value
+    """
+
+    if row < staff_offset or col < 2 or col > self.days_in_month+1:
+      return
+
+    n = shift_index.get(old_value)
+    if n is not None:
+      self.counts[col][n] -= 1
+    n = shift_index.get(self.schedule_data[row][col])
+    if n is not None:
+      self.counts[col][n] += 1
+
+  def is_more(self, row, col):
+    if row < staff_offset or col < 2 or col > self.days_in_month+1:
+      return False
+    n = shift_index.get(self.schedule_data[row][col])
+    if n is None:
+      return False
+    return self.counts[col][n] > self.schedule_data[n+1][col]
+
+  def is_denied(self, row, col):
+    if row < staff_offset or row >= len(self.preference_data) or \
+        col < 2 or col > self.days_in_month+1:
+      return False
+    return self.preference_data[row][col] in [day_off1, day_off2] and \
+      self.schedule_data[row][col] not in [day_off1, day_off2]
+
+
+def prev_month_last_shifts(last_month_data, staffs):
+  """
+  the shift, as a solver shift index, each of the staff records
+  worked on the last day of last month, None for a day off
+  """
+
+  last_shifts = [None for _ in staffs]
+  if last_month_data:
+    index = StaffIndex.from_grid(last_month_data)
+    staff_ids = set(staff[0] for staff in staffs)
+    for i, staff in enumerate(staffs):
+      position = index.find(staff, staff_ids)
+      if position is not None:
+        last_shifts[i] = shift_index.get(
+          last_month_data[staff_offset+position][-2])
+  return last_shifts
+
+
+def boundary_rest_violations(last_month_data, schedule_data):
+  """
+  staff rows of schedule_data whose first day breaks the rest rule
+  after their last day of last month
+
+  returns (row, last shift, first shift) for each of them
+  """
+
+  staffs = [row[0] for row in schedule_data[staff_offset:]]
+  last_shifts = prev_month_last_shifts(last_month_data, staffs)
+  violations = []
+  for i, yesterday in enumerate(last_shifts):
+    s = staff_offset + i
+    today = shift_index.get(schedule_data[s][2])
+    if (yesterday, today) in rest_violations:
+      violations.append((s, shift_codes[yesterday], shift_codes[today]))
+  return violations
+
+
+def prev_month_carry_over(last_month_data, staffs, work_day_constrain):
+  """
+  count the consecutive work days at the end of last month
+  for each of the staff records
+  """
+
+  constrain_days = work_day_constrain-1
+  prev_data = [[0 for _ in range(constrain_days)] for _ in staffs]
+  if last_month_data:
+    index = StaffIndex.from_grid(last_month_data)
+    staff_ids = set(staff[0] for staff in staffs)
+    for i, staff in enumerate(staffs):
+      # find the staff
+      position = index.find(staff, staff_ids)
+      if position is None:
+        continue
+
+      s = staff_offset + position
+      row_schedule = [col for col in last_month_data[s][-1-constrain_days:-1]]
+      cummulative_count = 0
+      for j, col in enumerate(row_schedule[::-1]):
+        if col not in unavailable:
+          cummulative_count += 1
+        prev_data[i][-(j+1)] = cummulative_count
+  return prev_data
+
+
+class ShiftVars(object):
+  """
+  the shift variables of every staff, the first variables of the model,
+  staff by staff, day by day, in shift order, so a staff's month or
+  a day's shifts are plain slices of the indices
+
+  shifts[(row, day, n)] gives the variable of a schedule_data row,
+  day column and shift index, created on first use
+  """
+
+  def __init__(self, model, num_staffs, days_in_month):
+    self.model = model
+    self.num_staffs = num_staffs
+    self.days_in_month = days_in_month
+    self.variables = [None] * (num_staffs*days_in_month*num_shifts)
+
+  def index(self, row, day, n):
+    return ((row-staff_offset)*self.days_in_month + day-2)*num_shifts + n
+
+  def __getitem__(self, key):
+    index = self.index(*key)
+    var = self.variables[index]
+    if var is None:
+      var = self.model.get_bool_var_from_proto_index(index)
+      self.variables[index] = var
+    return var
+
+  def __len__(self):
+    return len(self.variables)
+
+  def month(self, row):
+    """
+    all the shifts of a staff, num_shifts per day
+    month, days and shift only see variables already created
+    """
+
+    start = self.index(row, 2, 0)
+    return self.variables[start:start+self.days_in_month*num_shifts]
+
+  def days(self, row, first, last):
+    """
+    all the shifts of a staff from day column first up to, not including, last
+    """
+
+    return self.variables[self.index(row, first, 0):self.index(row, last, 0)]
+
+  def shift(self, row, n):
+    """
+    one shift of a staff on every day
+    """
+
+    return self.month(row)[n::num_shifts]
+
+
+# how the rest and work day rules are written
+#   pairwise: a <= 1 constraint for every pair of shifts too close together
+#             and a sum over every work day window
+#   compact:  an automaton over each staff's daily shifts and
+#             a running count of work days per staff
+encodings = ['pairwise', 'compact']
+default_encoding = 'pairwise'
+
+# (yesterday, today) shift pairs without 16 hours of rest, as
+# solver shift indices: day or evening then night, evening then day
+rest_violations = [(1, 0), (2, 0), (2, 1)]
+
+
+class ModelSkeleton(object):
+  """
+  the part of the CP-SAT model that only depends on the number of staffs,
+  the days of the month and the work day constrains
+
+  constraints on the data (required staffs, preferred shifts, carry over
+  from last month, days off) are added with placeholder bounds and
+  patched by build_model on a copy of the model
+  """
+
+  def __init__(self, num_staffs, days_in_month,
+               work_day_constrain, day_off_constrain,
+               encoding=default_encoding):
+    from ortools.sat.python import cp_model
+
+    if encoding not in encodings:
+      raise ValueError('unknown encoding: %s' % encoding)
+
+    LinearExpr = cp_model.LinearExpr
+    model = cp_model.CpModel()
+    self.model = model
+
+    # add variables, they are the first ones in the model
+    staffs = list(range(staff_offset, staff_offset+num_staffs))
+    self.staffs = staffs
+    shifts = ShiftVars(model, num_staffs, days_in_month)
+    variables = [model.NewBoolVar('shift_staff%d_day%d_shift%d' % (staff, day, n))
+                 for staff in staffs
+                 for day in range(2, days_in_month+2)
+                 for n in range(num_shifts)]
+    shifts.variables = variables
+    stride = days_in_month*num_shifts
+
+    # each day should have the required number of staff for work
+    self.required = {}
+    for day in range(2, days_in_month+2):
+      for n in range(num_shifts):
+        start = shifts.index(staff_offset, day, n)
+        total = LinearExpr.Sum(variables[start::stride])
+        self.required[(day, n)] = model.Add(total >= 0).Index()
+
+    # every staff should only work when there are at least 16 hour
+    # in between each shift
+    for staff in staffs:
+      month = shifts.month(staff)
+      for d in range(days_in_month):
+        model.Add(LinearExpr.Sum(month[d*num_shifts:(d+1)*num_shifts]) <= 1)
+
+        if encoding == 'pairwise' and d+2 < days_in_month:
+          # day and evening shift followed by night shift,
+          # evening shift followed by night and day shift
+          model.Add(LinearExpr.Sum(month[d*num_shifts+1:d*num_shifts+4]) <= 1)
+          model.Add(LinearExpr.Sum(month[d*num_shifts+2:d*num_shifts+5]) <= 1)
+
+      if encoding == 'compact':
+        self.add_rest_automaton(model, month, days_in_month)
+
+    # at least preference_shift_count of the preferred shift,
+    # only enforced for the staffs preferring night or evening shift
+    self.preferred = {}
+    for staff in staffs:
+      model.Add(LinearExpr.Sum(shifts.month(staff)) <= days_in_month)
+
+      for n in [0, 2]:
+        total = LinearExpr.Sum(shifts.shift(staff, n))
+        self.preferred[(staff, n)] = model.Add(total >= 0).Index()
+
+    if encoding == 'compact':
+      self.add_work_day_counts(model, shifts, days_in_month,
+                               work_day_constrain, day_off_constrain)
+      return
+
+    # for a number days of work, each staff should have at least some days off
+    for start_day in range(2, days_in_month+2-work_day_constrain):
+      for staff in staffs:
+        total = LinearExpr.Sum(shifts.days(staff, start_day,
+                                           start_day+work_day_constrain))
+        model.Add(total <= work_day_constrain-day_off_constrain)
+
+    # also check the work days from previous month
+    self.carry_over = {}
+    for num_day in range(1, work_day_constrain):
+      for staff in staffs:
+        total = LinearExpr.Sum(shifts.days(staff, 2, 2+num_day))
+        self.carry_over[(staff, num_day)] = model.Add(
+          total <= work_day_constrain-day_off_constrain).Index()
+
+    # the number of work days left after the required days off
+    self.work_days = {}
+    for staff in staffs:
+      total = LinearExpr.Sum(shifts.month(staff))
+      self.work_days[staff] = model.Add(total <= days_in_month).Index()
+
+  def add_rest_automaton(self, model, month, days_in_month):
+    """
+    the rest rule as an automaton over the shift of each day,
+    0 for a day off and n+1 for shift n, the state is yesterday's shift
+
+    like the pairwise encoding it leaves out the last two days
+    """
+
+    transitions = [(yesterday, today, today)
+                   for yesterday in range(num_shifts+1)
+                   for today in range(num_shifts+1)
+                   if (yesterday-1, today-1) not in rest_violations]
+
+    days = []
+    for d in range(days_in_month-1):
+      day = model.NewIntVar(0, num_shifts, '')
+      model.Add(day == sum((n+1) * month[d*num_shifts+n]
+                           for n in range(num_shifts)))
+      days.append(day)
+    model.AddAutomaton(days, 0, list(range(num_shifts+1)), transitions)
+
+  def add_work_day_counts(self, model, shifts, days_in_month,
+                          work_day_constrain, day_off_constrain):
+    """
+    the work day rules on a running count of work days per staff,
+    every window is then the difference of two counts
+    """
+
+    from ortools.sat.python import cp_model
+
+    LinearExpr = cp_model.LinearExpr
+    max_work_days = work_day_constrain-day_off_constrain
+
+    self.carry_over = {}
+    self.work_days = {}
+    for staff in self.staffs:
+      month = shifts.month(staff)
+      # counts[d] is the number of work days up to and including day d
+      counts = []
+      for d in range(days_in_month):
+        count = model.NewIntVar(0, d+1, '')
+        work = LinearExpr.Sum(month[d*num_shifts:(d+1)*num_shifts])
+        if counts:
+          model.Add(count == counts[-1] + work)
+        else:
+          model.Add(count == work)
+        counts.append(count)
+
+      # for a number days of work, each staff should have at least some days off
+      for first in range(days_in_month-work_day_constrain):
+        last = first+work_day_constrain-1
+        if first == 0:
+          model.Add(counts[last] <= max_work_days)
+        else:
+          model.Add(counts[last] - counts[first-1] <= max_work_days)
+
+      # also check the work days from previous month
+      for num_day in range(1, work_day_constrain):
+        self.carry_over[(staff, num_day)] = model.Add(
+          counts[num_day-1] <= max_work_days).Index()
+
+      # the number of work days left after the required days off
+      self.work_days[staff] = model.Add(
+        counts[-1] <= days_in_month).Index()
+
+
+model_skeletons = {}
+model_skeletons_lock = threading.Lock()
+# number of skeletons kept, one per ward and month shape
+model_skeleton_cache_size = 8
+
+
+def model_skeleton(num_staffs, days_in_month,
+                   work_day_constrain, day_off_constrain,
+                   encoding=default_encoding):
+  """
+  cached ModelSkeleton for the structural parameters
+  """
+
+  key = (num_staffs, days_in_month, work_day_constrain, day_off_constrain,
+         encoding)
+  with model_skeletons_lock:
+    skeleton = model_skeletons.pop(key, None)
+    if skeleton is None:
+      skeleton = ModelSkeleton(*key)
+    # keep the most recently used last
+    model_skeletons[key] = skeleton
+    while len(model_skeletons) > model_skeleton_cache_size:
+      del model_skeletons[next(iter(model_skeletons))]
+  return skeleton
+
+
+@timed('build')
+def build_model(schedule_data, preference_data, days_in_month,
+                work_day_constrain, day_off_constrain, last_month_data=None,
+                encoding=default_encoding):
+  """
+  build the CP-SAT model from a copy of the cached skeleton
+  encoding is one of encodings
+
+  returns the model, the shift variables keyed by (row, day, shift)
+  and the list of staff rows
+  """
+
+  skeleton = model_skeleton(len(schedule_data)-staff_offset, days_in_month,
+                            work_day_constrain, day_off_constrain, encoding)
+  model = skeleton.model.clone()
+  shifts = ShiftVars(model, len(skeleton.staffs), days_in_month)
+  staffs = skeleton.staffs
+
+  constraints = model.proto.constraints
+  variables = model.proto.variables
+
+  def set_lower_bound(index, value):
+    constraints[index].linear.domain[0] = int(value)
+
+  def set_upper_bound(index, value):
+    constraints[index].linear.domain[1] = int(value)
+
+  def forbid(staff, day, n):
+    variables[shifts.index(staff, day, n)].domain[1] = 0
+
+  # each day should have the required number of staff for work
+  for day in range(2, days_in_month+2):
+    for n in range(num_shifts):
+      set_lower_bound(skeleton.required[(day, n)], schedule_data[n+1][day])
+
+  # if this staff prefer night shift or evening shift
+  # this staff should have at least 16 that kind of shift for this month
+  preference_shift_count = 16
+  for staff in staffs:
+    staff_pref = schedule_data[staff][0][3]
+    if staff_pref == shift_types[0]:
+      set_lower_bound(skeleton.preferred[(staff, 0)], preference_shift_count)
+    elif staff_pref == shift_types[2]:
+      set_lower_bound(skeleton.preferred[(staff, 2)], preference_shift_count)
+
+  # also check the work days from previous month
+  prev_month_data = prev_month_carry_over(
+    last_month_data, [schedule_data[s][0] for s in staffs], work_day_constrain)
+  for num_day in range(1, work_day_constrain):
+    for i, staff in enumerate(staffs):
+      already_working = prev_month_data[i][num_day-1]
+      set_upper_bound(skeleton.carry_over[(staff, num_day)],
+                      work_day_constrain-day_off_constrain-already_working)
+
+  # and the rest between the last day of previous month and the first day
+  last_shifts = prev_month_last_shifts(
+    last_month_data, [schedule_data[s][0] for s in staffs])
+  for i, staff in enumerate(staffs):
+    for yesterday, today in rest_violations:
+      if last_shifts[i] == yesterday:
+        forbid(staff, 2, today)
+
+  staff_rows = range(staff_offset, min(len(preference_data), len(schedule_data)))
+
+  # staff should not be working
+  # when business travel is scheduled
+  for staff in staff_rows:
+    for day in range(2, days_in_month+2):
+      if preference_data[staff][day] == business_travel:
+        for n in range(num_shifts):
+          forbid(staff, day, n)
+
+  # every staff should have at least the same number of day off
+  # as the number of saturday and sunday plus
+  # the number of national holiday
+  total_number_day_off_required = preference_data[0][-1]
+  num_work_days = days_in_month-total_number_day_off_required
+  for staff in staff_rows:
+    set_upper_bound(skeleton.work_days[staff], num_work_days)
+
+  # if this staff is limited to the type of shift
+  # only give the staff that shift
+  for staff in staff_rows:
+    limited_shift = schedule_data[staff][1]
+    if limited_shift in shift_index:
+      for n in range(num_shifts):
+        if n != shift_index[limited_shift]:
+          for day in range(2, days_in_month+2):
+            forbid(staff, day, n)
+
+  set_objective(model, preference_weights(shifts, schedule_data,
+                                          preference_data, days_in_month))
+  return model, shifts, staffs
+
+
+# shifts that go against a request
+denied_shifts = {
+  day_off1: [0, 1, 2],
+  day_off2: [0, 1, 2],
+  night_shift: [1, 2],
+  day_shift: [0, 2],
+  evening_shift: [0, 1],
+}
+
+
+def preference_weights(shifts, schedule_data, preference_data,
+                       days_in_month):
+  """
+  optimization objective
+  try to satisfy the request made by staffs
+
+  every shift variable gets a weight, the number of requests it goes against
+  """
+
+  weights = [0] * len(shifts)
+  for s in range(staff_offset, len(preference_data)):
+    for day in range(2, days_in_month+2):
+      for n in denied_shifts.get(preference_data[s][day], []):
+        weights[shifts.index(s, day, n)] += 1
+
+    # staffs preferring night or evening shift should avoid the others
+    other_shifts = []
+    if schedule_data[s][0][3] == shift_types[0]:
+      other_shifts = [1, 2]
+    elif schedule_data[s][0][3] == shift_types[2]:
+      other_shifts = [0, 1]
+    for n in other_shifts:
+      for day in range(2, days_in_month+2):
+        weights[shifts.index(s, day, n)] += 1
+
+  return weights
+
+
+def set_objective(model, weights, offset=0):
+  """
+  minimize the weighted sum of the shift variables, written to
+  the model proto directly instead of through a linear expression
+  """
+
+  model.clear_objective()
+  objective = model.proto.objective
+  indices = [index for index, weight in enumerate(weights) if weight]
+  objective.vars.extend(indices)
+  objective.coeffs.extend([weights[index] for index in indices])
+  objective.offset = offset
+  objective.scaling_factor = 1.0
+
+
+@timed('decode')
+def decode_solution(solver, shifts, schedule_data, preference_data,
+                    days_in_month):
+  """
+  read the shift of every staff for every day from the solver
+
+  returns one row of shift codes per staff, in schedule_data order
+  """
+
+  # the solver or a solution callback
+  solution = list(solver.response_proto.solution)
+
+  rows = []
+  for s in range(staff_offset, len(schedule_data)):
+    staff = s
+    row = []
+    for day in range(2, days_in_month+2):
+      index = shifts.index(staff, day, 0)
+      if solution[index]:
+        row.append(night_shift)
+      elif solution[index+1]:
+        row.append(day_shift)
+      elif solution[index+2]:
+        row.append(evening_shift)
+      else:
+        # setting day off
+        if preference_data[s][day] in unavailable:
+          row.append(preference_data[s][day])
+        else:
+          row.append(day_off1)
+    rows.append(row)
+  return rows
+
+
+def apply_solution(schedule_data, rows, days_in_month):
+  for i, row in enumerate(rows):
+    schedule_data[staff_offset+i][2:days_in_month+2] = row
+
+
+def add_hints(model, shifts, schedule_data, days_in_month):
+  """
+  hint the solver with the shifts already in schedule_data,
+  so re-optimizing after a small edit starts from the saved roster
+
+  returns False, without adding hints, if no staff has a shift yet
+  """
+
+  has_shift = any(schedule_data[s][day] in shift_index
+                  for s in range(staff_offset, len(schedule_data))
+                  for day in range(2, days_in_month+2))
+  if not has_shift:
+    return False
+
+  hint = model.proto.solution_hint
+  for s in range(staff_offset, len(schedule_data)):
+    for day in range(2, days_in_month+2):
+      n = shift_index.get(schedule_data[s][day])
+      index = shifts.index(s, day, 0)
+      hint.vars.extend(range(index, index+num_shifts))
+      hint.values.extend([int(i == n) for i in range(num_shifts)])
+  return True
+
+
+def staff_classes(schedule_data, preference_data, days_in_month,
+                  carry_over, last_shifts, same_schedule=False):
+  """
+  groups of staff rows the solver cannot tell apart: same preferred
+  shift, limit, requests, work days carried over from last month and
+  shift on the last day of last month, which forbids some shifts on the 1st
+  with same_schedule their current shifts have to match too
+
+  only groups of two or more are returned, in row order
+  """
+
+  classes = {}
+  for i, s in enumerate(range(staff_offset, len(schedule_data))):
+    if s >= len(preference_data):
+      break
+    key = (schedule_data[s][0][3], schedule_data[s][1],
+           tuple(preference_data[s][2:days_in_month+2]), tuple(carry_over[i]),
+           last_shifts[i])
+    if same_schedule:
+      key += (tuple(schedule_data[s][2:days_in_month+2]),)
+    classes.setdefault(key, []).append(s)
+  return [rows for rows in classes.values() if len(rows) > 1]
+
+
+def add_lex_order(model, a, b):
+  """
+  the boolean list a is lexicographically greater than or equal to b
+  """
+
+  prefix_equal = None
+  for x, y in zip(a, b):
+    if prefix_equal is None:
+      model.AddImplication(y, x)
+    else:
+      model.AddBoolOr([prefix_equal.Not(), y.Not(), x])
+
+    # equal stays true only while all the values so far are equal,
+    # given x >= y they are unequal when x is set and y is not
+    equal = model.NewBoolVar('')
+    if prefix_equal is not None:
+      model.AddImplication(equal, prefix_equal)
+      model.AddBoolOr([prefix_equal.Not(), x, equal])
+      model.AddBoolOr([prefix_equal.Not(), y.Not(), equal])
+    else:
+      model.AddBoolOr([x, equal])
+      model.AddBoolOr([y.Not(), equal])
+    model.AddBoolOr([equal.Not(), x.Not(), y])
+    prefix_equal = equal
+
+
+def break_symmetry(model, shifts, classes):
+  """
+  order the rosters of interchangeable staffs, so the solver
+  does not have to go through every permutation of them
+  """
+
+  for rows in classes:
+    for first, second in zip(rows, rows[1:]):
+      add_lex_order(model,
+                    [shifts[(first, day, n)]
+                     for day in range(2, shifts.days_in_month+2)
+                     for n in range(num_shifts)],
+                    [shifts[(second, day, n)]
+                     for day in range(2, shifts.days_in_month+2)
+                     for n in range(num_shifts)])
+
+
+def repair_neighborhood(schedule_data, days_in_month, cells=(), days=(),
+                        radius=1):
+  """
+  the (row, day column) cells a repair may change
+
+  every staff is free on the days within radius of a changed cell
+  or inside the date window, except on the changed cells themselves
+  """
+
+  free_days = set(days)
+  for row, col in cells:
+    free_days.update(range(col-radius, col+radius+1))
+  free_days = [day for day in free_days if 2 <= day < days_in_month+2]
+
+  changed = set(cells)
+  return set((s, day)
+             for s in range(staff_offset, len(schedule_data))
+             for day in free_days
+             if (s, day) not in changed)
+
+
+def fix_cells(model, shifts, schedule_data, days_in_month, free):
+  """
+  keep every cell outside free on the shift it has in schedule_data
+  by narrowing the variable domains
+  """
+
+  variables = model.proto.variables
+  for s in range(staff_offset, len(schedule_data)):
+    for day in range(2, days_in_month+2):
+      if (s, day) in free:
+        continue
+      n = shift_index.get(schedule_data[s][day])
+      for i in range(num_shifts):
+        value = int(i == n)
+        domain = variables[shifts.index(s, day, i)].domain
+        if domain[0] <= value <= domain[1]:
+          domain[0] = value
+          domain[1] = value
+        else:
+          # e.g. a shift on a business travel day, keep it infeasible
+          model.Add(shifts[(s, day, i)] == value)
+
+
+def add_change_weights(weights, shifts, schedule_data, free, change_weight=1):
+  """
+  make every free cell given a different shift than in schedule_data
+  cost change_weight, returns the objective offset this needs
+  """
+
+  offset = 0
+  for s, day in free:
+    n = shift_index.get(schedule_data[s][day])
+    if n is None:
+      for i in range(num_shifts):
+        weights[shifts.index(s, day, i)] += change_weight
+    else:
+      # 1 - shift
+      weights[shifts.index(s, day, n)] -= change_weight
+      offset += change_weight
+  return offset
+
+
+def count_changes(schedule_data, rows, days_in_month):
+  """
+  number of staff cells whose shift differs from rows
+  """
+
+  total = 0
+  for i, row in enumerate(rows):
+    old = schedule_data[staff_offset+i][2:days_in_month+2]
+    total += sum(shift_index.get(a) != shift_index.get(b)
+                 for a, b in zip(old, row))
+  return total
+
+
+class SolveControl(object):
+  """
+  lets another thread stop a running solve, the best roster
+  found so far is still returned
+  """
+
+  def __init__(self):
+    self.lock = threading.Lock()
+    self.stopped = False
+    self.solver = None
+
+  def attach(self, solver):
+    """
+    called before Solve, which clears any earlier StopSearch
+    """
+
+    with self.lock:
+      self.solver = solver
+      if self.stopped:
+        solver.parameters.max_time_in_seconds = 0.0
+
+  def detach(self):
+    with self.lock:
+      self.solver = None
+
+  def stop(self):
+    with self.lock:
+      self.stopped = True
+      if self.solver is not None:
+        self.solver.StopSearch()
+
+
+class Progress(object):
+  """
+  an improving solution found while the solver is still running
+  rows is the roster, in decode_solution layout, if it was asked for
+  """
+
+  def __init__(self, objective, bound, elapsed, num_solutions, rows=None):
+    self.objective = objective
+    self.bound = bound
+    self.elapsed = elapsed
+    self.num_solutions = num_solutions
+    self.rows = rows
+
+  @property
+  def gap(self):
+    return abs(self.objective - self.bound) / max(1.0, abs(self.objective))
+
+  def message(self):
+    return 'solution %d: objective %g, bound %g, gap %.1f%%, %.2fs' % (
+      self.num_solutions, self.objective, self.bound, self.gap * 100,
+      self.elapsed)
+
+
+def new_solution_callback(on_progress=None, decode=None, control=None):
+  """
+  solution callback recording when the first solution was found
+  and passing every improving solution to on_progress,
+  with the roster when decode is given
+  it also stops the search if control was stopped before Solve started
+
+  on_progress is called from the solver thread
+  """
+
+  from ortools.sat.python import cp_model
+
+  class SolutionCallback(cp_model.CpSolverSolutionCallback):
+    def __init__(self):
+      super(SolutionCallback, self).__init__()
+      self.first_solution_time = None
+      self.num_solutions = 0
+
+    def on_solution_callback(self):
+      if self.first_solution_time is None:
+        self.first_solution_time = self.WallTime()
+      self.num_solutions += 1
+      if control is not None and control.stopped:
+        self.StopSearch()
+
+      if on_progress is not None:
+        rows = decode(self) if decode is not None else None
+        on_progress(Progress(self.ObjectiveValue(), self.BestObjectiveBound(),
+                             self.WallTime(), self.num_solutions, rows))
+
+  return SolutionCallback()
+
+
+class SolverProfile(object):
+  """
+  CP-SAT search parameters, trading solve time for roster quality
+  """
+
+  def __init__(self, name, num_workers, max_time_in_seconds,
+               linearization_level=0, randomize_search=False, random_seed=0):
+    self.name = name
+    self.num_workers = num_workers
+    self.max_time_in_seconds = max_time_in_seconds
+    self.linearization_level = linearization_level
+    self.randomize_search = randomize_search
+    self.random_seed = random_seed
+
+  def extended(self, seconds):
+    """
+    the same search given a different time limit
+    """
+
+    return SolverProfile(self.name, self.num_workers, seconds,
+                         self.linearization_level, self.randomize_search,
+                         self.random_seed)
+
+  def with_workers(self, num_workers):
+    """
+    the same search on a different number of cores
+    """
+
+    return SolverProfile(self.name, num_workers, self.max_time_in_seconds,
+                         self.linearization_level, self.randomize_search,
+                         self.random_seed)
+
+  def apply(self, parameters):
+    parameters.num_workers = self.num_workers
+    parameters.max_time_in_seconds = self.max_time_in_seconds
+    parameters.linearization_level = self.linearization_level
+    parameters.randomize_search = self.randomize_search
+    parameters.random_seed = self.random_seed
+
+
+num_cores = os.cpu_count() or 1
+
+solver_profiles = {
+  'quick': SolverProfile('quick', min(4, num_cores), 5.0),
+  'balanced': SolverProfile('balanced', num_cores, 20.0),
+  'thorough': SolverProfile('thorough', num_cores, 120.0,
+                            linearization_level=2, randomize_search=True),
+}
+profile_names = ['quick', 'balanced', 'thorough']
+default_profile = 'balanced'
+
+
+def get_profile(profile):
+  """
+  look up a profile by name, profiles themselves are returned as is
+  """
+
+  if isinstance(profile, SolverProfile):
+    return profile
+  if profile not in solver_profiles:
+    raise ValueError('unknown solver profile: %s' % profile)
+  return solver_profiles[profile]
+
+
+class SolveResult(object):
+  def __init__(self, status, rows, objective, conflicts, branches, wall_time,
+               profile=default_profile, first_solution_time=None,
+               warm_start=False, lookahead=None):
+    self.status = status
+    self.rows = rows
+    self.objective = objective
+    self.conflicts = conflicts
+    self.branches = branches
+    self.wall_time = wall_time
+    self.profile = profile
+    self.first_solution_time = first_solution_time
+    self.warm_start = warm_start
+    # rosters of the months after the first one in a horizon solve
+    self.lookahead = lookahead
+    # returned from solve_results instead of searching again
+    self.cached = False
+
+  def has_solution(self):
+    return self.rows is not None
+
+  def statistics(self):
+    text = 'Statistics: conflicts: %d, branches: %d, wall time: %f' % (
+      self.conflicts, self.branches, self.wall_time)
+    if self.first_solution_time is not None:
+      text += ', first solution: %f%s' % (
+        self.first_solution_time, ' (warm start)' if self.warm_start else '')
+    if self.cached:
+      text += ' (cached)'
+    return text
+
+
+solve_results = {}
+solve_results_lock = threading.Lock()
+# number of solve results kept, a few per ward and month
+solve_cache_size = 32
+
+
+def solve_key(schedule_data, preference_data, days_in_month,
+              work_day_constrain, day_off_constrain, last_month_data,
+              profile, encoding, symmetry_breaking, warm_start):
+  """
+  stable hash of everything the model and the search depend on,
+  the shifts in schedule_data are only hints so they are left out,
+  unless symmetry breaking groups the staffs by them. whether they are
+  hinted at all still changes the search, so warm_start is kept
+  """
+
+  staffs = [row[0] for row in schedule_data[staff_offset:]]
+  data = {
+    'days_in_month': days_in_month,
+    'preference': preference_data,
+    'required': [row[2:days_in_month+2]
+                 for row in schedule_data[1:leader_offset]],
+    'staffs': [row[:2] for row in schedule_data[staff_offset:]],
+    'carry_over': prev_month_carry_over(last_month_data, staffs,
+                                        work_day_constrain),
+    'last_shifts': prev_month_last_shifts(last_month_data, staffs),
+    'work_day_constrain': work_day_constrain,
+    'day_off_constrain': day_off_constrain,
+    'profile': vars(profile),
+    'encoding': encoding,
+    'symmetry_breaking': symmetry_breaking,
+    'warm_start': warm_start,
+  }
+  if symmetry_breaking and warm_start:
+    data['schedule'] = [row[2:days_in_month+2]
+                        for row in schedule_data[staff_offset:]]
+  text = json.dumps(data, sort_keys=True, default=str)
+  return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def cached_result(key):
+  with solve_results_lock:
+    result = solve_results.pop(key, None)
+    if result is None:
+      return None
+    solve_results[key] = result
+  result = copy.deepcopy(result)
+  result.cached = True
+  return result
+
+
+def cache_result(key, result):
+  with solve_results_lock:
+    solve_results.pop(key, None)
+    solve_results[key] = copy.deepcopy(result)
+    while len(solve_results) > solve_cache_size:
+      del solve_results[next(iter(solve_results))]
+
+
+def solve(schedule_data, preference_data, days_in_month,
+          work_day_constrain=7, day_off_constrain=1, last_month_data=None,
+          profile=default_profile, warm_start=True, on_progress=None,
+          live_rows=False, control=None, encoding=default_encoding,
+          symmetry_breaking=False, cache=True):
+  """
+  optimize using CP-SAT model from google
+  profile is a SolverProfile or the name of one in solver_profiles
+
+  with warm_start the shifts already in schedule_data are used as hints
+  on_progress gets a Progress for every improving solution,
+  including the roster if live_rows is set
+  control is a SolveControl to stop the search early
+  encoding picks how the rest and work day rules are written
+  with symmetry_breaking the rosters of interchangeable staffs are ordered,
+  when warm started only staffs with the same current roster count as
+  interchangeable so no published roster moves to someone else.
+  CP-SAT finds most of these symmetries itself, so it is off by default
+  with cache a solve of the same inputs, see solve_key, returns the
+  earlier result at once
+  """
+
+  profile = get_profile(profile)
+
+  if cache:
+    key = solve_key(schedule_data, preference_data, days_in_month,
+                    work_day_constrain, day_off_constrain, last_month_data,
+                    profile, encoding, symmetry_breaking, warm_start)
+    result = cached_result(key)
+    if result is not None:
+      return result
+
+  model, shifts, staffs = build_model(schedule_data, preference_data,
+                                      days_in_month, work_day_constrain,
+                                      day_off_constrain, last_month_data,
+                                      encoding)
+
+  if warm_start:
+    warm_start = add_hints(model, shifts, schedule_data, days_in_month)
+
+  if symmetry_breaking:
+    records = [schedule_data[s][0] for s in staffs]
+    carry_over = prev_month_carry_over(last_month_data, records,
+                                       work_day_constrain)
+    last_shifts = prev_month_last_shifts(last_month_data, records)
+    break_symmetry(model, shifts,
+                   staff_classes(schedule_data, preference_data,
+                                 days_in_month, carry_over, last_shifts,
+                                 warm_start))
+
+  def decode(values):
+    return decode_solution(values, shifts, schedule_data, preference_data,
+                           days_in_month)
+
+  result = run_solver(model, decode, profile, warm_start, on_progress,
+                      live_rows, control)
+  # a search stopped early may find a better roster next time
+  if cache and result.has_solution() and \
+      (control is None or not control.stopped):
+    cache_result(key, result)
+  return result
+
+
+def run_solver(model, decode, profile, warm_start, on_progress=None,
+               live_rows=False, control=None):
+  """
+  decode reads the roster from the solver or a solution callback
+  """
+
+  from ortools.sat.python import cp_model
+
+  solver = cp_model.CpSolver()
+  profile.apply(solver.parameters)
+  callback = new_solution_callback(on_progress,
+                                   decode if live_rows else None, control)
+  if control is not None:
+    control.attach(solver)
+  try:
+    with scheduler_timing.phase('solve'):
+      status = solver.Solve(model, callback)
+  finally:
+    if control is not None:
+      control.detach()
+
+  rows = None
+  objective = None
+  if status in [cp_model.OPTIMAL, cp_model.FEASIBLE]:
+    rows = decode(solver)
+    objective = solver.ObjectiveValue()
+
+  return SolveResult(solver.StatusName(status), rows, objective,
+                     solver.NumConflicts(), solver.NumBranches(),
+                     solver.WallTime(), profile.name,
+                     callback.first_solution_time, warm_start)
+
+
+repair_radii = [1, 3, 7]
+
+
+def repair(schedule_data, preference_data, days_in_month, cells=(), days=(),
+           work_day_constrain=7, day_off_constrain=1, last_month_data=None,
+           profile=default_profile, change_weight=1, on_progress=None,
+           live_rows=False, control=None, encoding=default_encoding):
+  """
+  re-solve only around the changed cells and the date window
+  (day columns), keeping the rest of the schedule as it is
+
+  the changed cells keep the value they were edited to, the
+  neighborhood grows through repair_radii until a roster is found
+  changing a shift costs change_weight on top of the preference objective
+  on_progress, live_rows, control and encoding work as in solve
+  """
+
+  profile = get_profile(profile)
+
+  result = None
+  for radius in repair_radii:
+    free = repair_neighborhood(schedule_data, days_in_month, cells, days,
+                               radius)
+    model, shifts, staffs = build_model(schedule_data, preference_data,
+                                        days_in_month, work_day_constrain,
+                                        day_off_constrain, last_month_data,
+                                        encoding)
+    fix_cells(model, shifts, schedule_data, days_in_month, free)
+    weights = preference_weights(shifts, schedule_data, preference_data,
+                                 days_in_month)
+    offset = add_change_weights(weights, shifts, schedule_data, free,
+                                change_weight)
+    set_objective(model, weights, offset)
+    add_hints(model, shifts, schedule_data, days_in_month)
+
+    def decode(values, shifts=shifts, free=free):
+      rows = decode_solution(values, shifts, schedule_data, preference_data,
+                             days_in_month)
+      # cells outside the neighborhood keep their exact code, e.g. FF
+      for i, row in enumerate(rows):
+        for day in range(2, days_in_month+2):
+          if (staff_offset+i, day) not in free:
+            row[day-2] = schedule_data[staff_offset+i][day]
+      return rows
+
+    result = run_solver(model, decode, profile, True, on_progress, live_rows,
+                        control)
+    if result.has_solution() or (control is not None and control.stopped):
+      break
+  return result
+
+
+def join_months(months):
+  """
+  one long grid out of consecutive months, given as
+  (schedule_data, preference_data, days_in_month), so the rest and
+  work day rules also run across the month boundaries
+
+  every month needs the same staffs in the same rows, which is the
+  case when they were prepared with the same staff list
+  """
+
+  first_schedule, first_preference, _ = months[0]
+  records = [row[0][0] for row in first_schedule[staff_offset:]]
+  for schedule_data, preference_data, _ in months[1:]:
+    if [row[0][0] for row in schedule_data[staff_offset:]] != records or \
+        len(preference_data) != len(first_preference):
+      raise ValueError('every month of a horizon needs the same staffs')
+
+  def join(grids, i, head, tail):
+    row = list(head)
+    for grid, days_in_month in grids:
+      row.extend(grid[i][2:days_in_month+2])
+    row.append(tail)
+    return row
+
+  total_days = sum(days_in_month for _, _, days_in_month in months)
+  joined = []
+  for grids in [[(m[0], m[2]) for m in months], [(m[1], m[2]) for m in months]]:
+    first = grids[0][0]
+    data = [join(grids, 0, first[0][:2],
+                 sum(grid[0][-1] or 0 for grid, _ in grids))]
+    for i in range(1, leader_offset):
+      data.append(join(grids, i, first[i][:2], ''))
+    for i in range(leader_offset, len(first)):
+      data.append(join(grids, i, first[i][:2], 0))
+    joined.append(data)
+  return joined[0], joined[1], total_days
+
+
+def solve_horizon(months, work_day_constrain=7, day_off_constrain=1,
+                  last_month_data=None, profile=default_profile,
+                  warm_start=True, on_progress=None, live_rows=False,
+                  control=None, encoding=default_encoding):
+  """
+  solve consecutive months together, see join_months, so the end of
+  a month is not planned without looking at the start of the next one
+
+  the monthly rules (work days after the required days off, preferred
+  shift count) still hold for each month. returns the result of the
+  first month, result.lookahead has the rows of the later months.
+  progress rows, with live_rows, cover the whole horizon
+  """
+
+  profile = get_profile(profile)
+  schedule_data, preference_data, total_days = join_months(months)
+
+  model, shifts, staffs = build_model(schedule_data, preference_data,
+                                      total_days, work_day_constrain,
+                                      day_off_constrain, last_month_data,
+                                      encoding)
+
+  # the monthly rules, build_model only applied them to the whole horizon
+  preference_shift_count = 16
+  first_day = 2
+  for month_schedule, month_preference, days_in_month in months:
+    days = range(first_day, first_day+days_in_month)
+    num_work_days = days_in_month-(month_preference[0][-1] or 0)
+    for staff in staffs:
+      model.Add(sum(shifts[(staff, day, n)]
+                    for day in days
+                    for n in range(num_shifts)) <= num_work_days)
+
+      staff_pref = schedule_data[staff][0][3]
+      if staff_pref in [shift_types[0], shift_types[2]]:
+        n = 0 if staff_pref == shift_types[0] else 2
+        model.Add(sum(shifts[(staff, day, n)] for day in days) >=
+                  preference_shift_count)
+    first_day += days_in_month
+
+  if warm_start:
+    warm_start = add_hints(model, shifts, schedule_data, total_days)
+
+  def decode(values):
+    return decode_solution(values, shifts, schedule_data, preference_data,
+                           total_days)
+
+  result = run_solver(model, decode, profile, warm_start, on_progress,
+                      live_rows, control)
+  if result.has_solution():
+    month_rows = []
+    first_day = 0
+    for _, _, days_in_month in months:
+      month_rows.append([row[first_day:first_day+days_in_month]
+                         for row in result.rows])
+      first_day += days_in_month
+    result.rows = month_rows[0]
+    result.lookahead = month_rows[1:]
+  return result
@@ -0,0 +1,133 @@
+"""
+compact numpy representation of the request and schedule grids
+
+the json layout (see scheduler_engine) keeps every cell as a python
+object, here the same month is stored as
+
+  days_off | bool  (days,)          | row 0
+  required | int16 (3, days)        | rows 1-3
+  people   | list                   | column 0 of rows 4.. (leader first)
+  limits   | int8  (people,)        | column 1 of rows 4..
+  shifts   | int8  (people, days)   | day columns of rows 4..
+
+shift codes are stored as their index in codes, cells with other values
+are only allowed with strict=False and are kept aside in unknown
+"""
+
+import numpy as np
+
+from scheduler_engine import day_off1, day_off2, business_travel
+from scheduler_engine import night_shift, day_shift, evening_shift
+from scheduler_engine import shift_codes, unavailable
+
+
+codes = ['', day_off1, day_off2, business_travel,
+         night_shift, day_shift, evening_shift]
+code_index = {code: i for i, code in enumerate(codes)}
+
+# cells that are not a known code, only produced with strict=False
+other = len(codes)
+
+# lookup tables indexed by code
+off_lookup = np.array([code in unavailable for code in codes] + [False])
+shift_lookup = np.array([shift_codes.index(code) if code in shift_codes else -1
+                         for code in codes] + [-1], dtype=np.int8)
+
+
+def encode(value, strict=True):
+  if value is None:
+    return 0
+  try:
+    return code_index[value]
+  except (KeyError, TypeError):
+    if strict:
+      raise ValueError('unknown shift code: %r' % (value,))
+    return other
+
+
+class Grid(object):
+  def __init__(self, days_off, required, people, limits, shifts, unknown=None):
+    self.days_off = days_off
+    self.required = required
+    self.people = people
+    self.limits = limits
+    self.shifts = shifts
+    # (row, column) in the json layout of the cells stored as other
+    self.unknown = unknown or {}
+
+  @classmethod
+  def from_data(cls, data, strict=True):
+    """
+    convert a grid in the json layout, raises ValueError on unknown
+    shift codes unless strict is False
+    """
+
+    days_in_month = len(data[0]) - 3
+    people = [row[0] for row in data[4:]]
+
+    days_off = np.array([bool(v) for v in data[0][2:-1]], dtype=bool)
+    required = np.array([[int(v or 0) for v in row[2:-1]] for row in data[1:4]],
+                        dtype=np.int16)
+    limits = np.array([encode(row[1], strict) for row in data[4:]],
+                      dtype=np.int8)
+    shifts = np.array([[encode(v, strict) for v in row[2:-1]] for row in data[4:]],
+                      dtype=np.int8).reshape(len(people), days_in_month)
+
+    unknown = {}
+    for i in np.flatnonzero(limits == other).tolist():
+      unknown[(4+i, 1)] = data[4+i][1]
+    for i, day in np.argwhere(shifts == other).tolist():
+      unknown[(4+i, 2+day)] = data[4+i][2+day]
+    return cls(days_off, required, people, limits, shifts, unknown)
+
+  @property
+  def days_in_month(self):
+    return len(self.days_off)
+
+  def to_data(self):
+    """
+    convert back to the json layout, with the totals recomputed
+    """
+
+    data = [['Days off', ''] + self.days_off.tolist() + [int(self.days_off.sum())]]
+    for code, row in zip(shift_codes, self.required):
+      data.append([code, ''] + row.tolist() + [''])
+
+    known = codes + [None]
+    totals = self.day_off_totals()
+    for i, person in enumerate(self.people):
+      data.append([person, known[self.limits[i]]] +
+                  [known[c] for c in self.shifts[i]] + [int(totals[i])])
+    for (row, col), value in self.unknown.items():
+      data[row][col] = value
+    return data
+
+  def off_mask(self):
+    return off_lookup[self.shifts]
+
+  def day_off_totals(self):
+    """
+    number of days off, business travel included, for the leader and each staff
+    """
+
+    return self.off_mask().sum(axis=1)
+
+  def available(self):
+    """
+    number of people, leader included, not off on each day
+    """
+
+    return (~self.off_mask()).sum(axis=0)
+
+  def enough(self):
+    return self.available() >= self.required.sum(axis=0)
+
+  def shift_counts(self):
+    """
+    number of staffs, leader excluded, on each shift for each day
+    shape (3, days)
+    """
+
+    staff_shifts = shift_lookup[self.shifts[1:]]
+    return np.stack([(staff_shifts == n).sum(axis=0)
+                     for n in range(len(shift_codes))])
@@ -0,0 +1,261 @@
+"""
+opt-in timings of the named phases of the app
+
+  SCHEDULER_TIMINGS=timings.json      write a json summary at exit
+  SCHEDULER_TIMINGS_LOG=timings.log   log every phase, rotated at 1MB
+  SCHEDULER_TIMINGS_MEMORY=1          also trace memory with tracemalloc
+
+nothing is measured until enabled, then every phase records its number
+of calls, total and longest time and, with memory tracing, the most
+memory allocated while it ran. phases may nest, e.g. decode runs inside
+solve when the roster is shown live
+
+tracemalloc has one peak for the whole process, it is reset when a phase
+starts, so the peaks of the phases still open and of the process are
+kept here. memory allocated by another thread counts for every phase
+open at the time
+"""
+
+import os
+import json
+import time
+import atexit
+import threading
+from datetime import datetime
+
+
+enabled = False
+trace_memory = False
+logger = None
+log_handler = None
+summary_path = None
+
+phases = {}
+phases_lock = threading.Lock()
+# phases open in any thread, for their memory peaks
+open_phases = []
+# highest traced memory of the process, across the peak resets
+memory_peak = 0
+
+log_max_bytes = 1 << 20
+log_backup_count = 3
+
+
+class PhaseStats(object):
+  def __init__(self):
+    self.calls = 0
+    self.total = 0.0
+    self.longest = 0.0
+    self.memory = None
+
+  def add(self, elapsed, memory=None):
+    self.calls += 1
+    self.total += elapsed
+    self.longest = max(self.longest, elapsed)
+    if memory is not None:
+      self.memory = max(self.memory or 0, memory)
+
+  def as_dict(self):
+    stats = {
+      'calls': self.calls,
+      'total': self.total,
+      'mean': self.total / self.calls if self.calls else 0.0,
+      'longest': self.longest,
+    }
+    if self.memory is not None:
+      stats['memory'] = self.memory
+    return stats
+
+
+class phase(object):
+  """
+  context manager timing one call of the named phase
+
+    with scheduler_timing.phase('build'):
+      ...
+  """
+
+  __slots__ = ['name', 'start', 'memory_start', 'memory_peak']
+
+  def __init__(self, name):
+    self.name = name
+    self.start = None
+
+  def __enter__(self):
+    if not enabled:
+      return self
+    if trace_memory:
+      enter_memory(self)
+    self.start = time.perf_counter()
+    return self
+
+  def __exit__(self, exc_type, exc_value, traceback):
+    if self.start is None:
+      return False
+    elapsed = time.perf_counter() - self.start
+    memory = exit_memory(self) if trace_memory else None
+    record(self.name, elapsed, memory)
+    return False
+
+
+def enter_memory(frame):
+  global memory_peak
+  import tracemalloc
+
+  with phases_lock:
+    current, peak = tracemalloc.get_traced_memory()
+    # the peak is reset for this phase, keep it for the open ones
+    memory_peak = max(memory_peak, peak)
+    for other in open_phases:
+      other.memory_peak = max(other.memory_peak, peak)
+    tracemalloc.reset_peak()
+    frame.memory_start = current
+    frame.memory_peak = current
+    open_phases.append(frame)
+
+
+def exit_memory(frame):
+  global memory_peak
+  import tracemalloc
+
+  with phases_lock:
+    _, peak = tracemalloc.get_traced_memory()
+    memory_peak = max(memory_peak, peak)
+    frame.memory_peak = max(frame.memory_peak, peak)
+    if frame in open_phases:
+      open_phases.remove(frame)
+  return frame.memory_peak - frame.memory_start
+
+
+def timed(name):
+  """
+  decorator timing every call of a function as the named phase
+  """
+
+  def decorate(function):
+    def wrapper(*args, **kwargs):
+      with phase(name):
+        return function(*args, **kwargs)
+    wrapper.__name__ = function.__name__
+    wrapper.__doc__ = function.__doc__
+    return wrapper
+  return decorate
+
+
+def record(name, elapsed, memory=None):
+  with phases_lock:
+    stats = phases.get(name)
+    if stats is None:
+      stats = phases[name] = PhaseStats()
+    stats.add(elapsed, memory)
+  if logger is not None:
+    if memory is None:
+      logger.info('%s %.6f', name, elapsed)
+    else:
+      logger.info('%s %.6f %d', name, elapsed, memory)
+
+
+def enable(path=None, log_path=None, memory=False):
+  """
+  start measuring, the summary is written to path at exit and every
+  phase is logged to log_path. enabling again replaces both
+  """
+
+  global enabled, trace_memory, logger, log_handler, summary_path
+
+  if log_path:
+    import logging
+    import logging.handlers
+
+    logger = logging.getLogger('scheduler.timing')
+    if log_handler is not None:
+      logger.removeHandler(log_handler)
+      log_handler.close()
+    log_handler = logging.handlers.RotatingFileHandler(
+      log_path, maxBytes=log_max_bytes, backupCount=log_backup_count)
+    log_handler.setFormatter(logging.Formatter('%(asctime)s %(message)s'))
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+    logger.addHandler(log_handler)
+
+  if memory:
+    import tracemalloc
+    if not tracemalloc.is_tracing():
+      tracemalloc.start()
+    trace_memory = True
+
+  if path:
+    if summary_path is None:
+      atexit.register(write_exit_summary)
+    summary_path = path
+  enabled = True
+
+
+def write_exit_summary():
+  if summary_path:
+    write_summary(summary_path)
+
+
+def enable_from_environment(environ=None):
+  """
+  enable with the SCHEDULER_TIMINGS variables, see the top of this file
+  returns whether timings are enabled
+  """
+
+  if environ is None:
+    environ = os.environ
+  path = environ.get('SCHEDULER_TIMINGS')
+  log_path = environ.get('SCHEDULER_TIMINGS_LOG')
+  memory = environ.get('SCHEDULER_TIMINGS_MEMORY', '') not in ['', '0']
+  if path or log_path:
+    enable(path, log_path, memory)
+  return enabled
+
+
+def reset():
+  with phases_lock:
+    phases.clear()
+
+
+def summary():
+  """
+  the stats of every phase so far, in a json friendly dict
+  """
+
+  with phases_lock:
+    stats = dict((name, phases[name].as_dict()) for name in sorted(phases))
+  result = {
+    'created': datetime.now().isoformat(timespec='seconds'),
+    'phases': stats,
+  }
+  if trace_memory:
+    import tracemalloc
+    if tracemalloc.is_tracing():
+      with phases_lock:
+        result['memory_peak'] = max(memory_peak,
+                                    tracemalloc.get_traced_memory()[1])
+  return result
+
+
+def write_summary(path):
+  with open(path, 'w') as f:
+    json.dump(summary(), f, indent=2)
+    f.write('\n')
+
+
+def format_summary():
+  """
+  one line per phase, the longest total first
+  """
+
+  stats = summary()['phases']
+  lines = ['%-16s %7s %10s %10s %10s' % ('phase', 'calls', 'total',
+                                         'mean', 'longest')]
+  for name in sorted(stats, key=lambda name: -stats[name]['total']):
+    s = stats[name]
+    line = '%-16s %7d %9.4fs %9.4fs %9.4fs' % (
+      name, s['calls'], s['total'], s['mean'], s['longest'])
+    if 'memory' in s:
+      line += ' %8.1fMB' % (s['memory'] / float(1 << 20))
+    lines.append(line)
+  return '\n'.join(lines)
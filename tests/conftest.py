@@ -0,0 +1,37 @@
+import os
+import sys
+from calendar import monthrange
+
+import pytest
+
+# the modules live at the top of the repository
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import scheduler_db
+from benchmarks import wards
+
+
+@pytest.fixture
+def ward_db(tmp_path):
+  """
+  make_db(months, num_staffs=20, seed=0) creates a ward database with a
+  synthetic request for each (year, month) and returns its path
+  """
+
+  def make_db(months, num_staffs=20, seed=0, name='ward.sqlite3'):
+    path = str(tmp_path / name)
+    connection = scheduler_db.connect(path)
+    cursor = connection.cursor()
+    for year, month in months:
+      first_day, days_in_month = monthrange(year, month)
+      ward = wards.synthetic_ward(num_staffs, days_in_month, first_day, seed)
+      scheduler_db.save_month(cursor, 'requests', year, month,
+                              ward.request_data)
+    for _, staff_id, name, preference in ward.staffs:
+      scheduler_db.add_staff(cursor, staff_id, name, preference)
+    for _, leader_id, name in ward.leaders:
+      scheduler_db.add_leader(cursor, leader_id, name)
+    connection.commit()
+    connection.close()
+    return path
+  return make_db
@@ -0,0 +1,20 @@
+import os
+
+import scheduler_cli
+
+
+def test_batch_reports_each_ward(ward_db, tmp_path):
+  good = ward_db([(2026, 11)])
+  bad = str(tmp_path / 'bad.sqlite3')
+  with open(bad, 'w') as f:
+    f.write('not a database' * 10)
+  again = os.path.join(os.path.dirname(good), '.', os.path.basename(good))
+
+  results = scheduler_cli.solve_wards([good, bad, again], 2026, 11,
+                                      profile='quick', cpus=1, time_limit=5)
+
+  assert [db for db, _, _ in results] == [good, bad]
+  _, result, error = results[0]
+  assert error is None and result.has_solution()
+  _, result, error = results[1]
+  assert result is None and 'DatabaseError' in error
@@ -0,0 +1,93 @@
+import scheduler_engine
+from scheduler_engine import staff_offset, day_off1, night_shift
+from benchmarks import wards
+
+
+def copy_grid(data):
+  return [list(row) for row in data]
+
+
+def test_solve_cache():
+  days_in_month = 30
+  schedule_data, preference_data = wards.synthetic_month(10, days_in_month)
+  last_month_data = copy_grid(schedule_data)
+  for row in last_month_data[staff_offset:]:
+    row[2:days_in_month+2] = [day_off1] * days_in_month
+  profile = scheduler_engine.get_profile('quick').extended(5)
+
+  inputs = {
+    'schedule_data': schedule_data,
+    'preference_data': preference_data,
+    'days_in_month': days_in_month,
+    'work_day_constrain': 7,
+    'day_off_constrain': 1,
+    'last_month_data': last_month_data,
+    'profile': profile,
+    'encoding': 'pairwise',
+    'symmetry_breaking': False,
+    'warm_start': True,
+  }
+
+  scheduler_engine.solve_results.clear()
+  try:
+    result = scheduler_engine.solve(copy_grid(schedule_data), preference_data,
+                                    days_in_month,
+                                    last_month_data=last_month_data,
+                                    profile=profile)
+    assert result.has_solution() and not result.cached
+    again = scheduler_engine.solve(copy_grid(schedule_data), preference_data,
+                                   days_in_month,
+                                   last_month_data=last_month_data,
+                                   profile=profile)
+    assert again.cached
+    assert again.rows == result.rows
+    assert scheduler_engine.cached_result(
+      scheduler_engine.solve_key(**inputs)) is not None
+
+    # the cached copy is not changed by changing the result
+    again.rows[0][0] = None
+    assert scheduler_engine.cached_result(
+      scheduler_engine.solve_key(**inputs)).rows == result.rows
+
+    changed_requests = copy_grid(preference_data)
+    row = changed_requests[staff_offset]
+    row[2] = day_off1 if row[2] != day_off1 else ''
+    changed_limits = copy_grid(schedule_data)
+    changed_limits[staff_offset][1] = night_shift
+    changed_last_month = copy_grid(last_month_data)
+    changed_last_month[staff_offset][-2] = night_shift
+
+    changes = [
+      {'preference_data': changed_requests},
+      {'schedule_data': changed_limits},
+      {'last_month_data': changed_last_month},
+      {'profile': profile.extended(10)},
+      {'profile': scheduler_engine.get_profile('thorough')},
+      {'encoding': 'compact'},
+      {'symmetry_breaking': True},
+      {'warm_start': False},
+    ]
+    for change in changes:
+      changed = dict(inputs, **change)
+      key = scheduler_engine.solve_key(**changed)
+      assert scheduler_engine.cached_result(key) is None, sorted(change)
+  finally:
+    scheduler_engine.solve_results.clear()
+
+
+def test_cache_evicts_oldest():
+  result = scheduler_engine.SolveResult('OPTIMAL', [], 0, 0, 0, 0.0)
+  scheduler_engine.solve_results.clear()
+  try:
+    size = scheduler_engine.solve_cache_size
+    for i in range(size+1):
+      scheduler_engine.cache_result('key %d' % i, result)
+    assert scheduler_engine.cached_result('key 0') is None
+    assert scheduler_engine.cached_result('key 1') is not None
+
+    # a hit is the newest again
+    scheduler_engine.cache_result('key new', result)
+    assert scheduler_engine.cached_result('key 1') is not None
+    assert scheduler_engine.cached_result('key 2') is None
+  finally:
+    scheduler_engine.solve_results.clear()
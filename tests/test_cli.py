@@ -0,0 +1,23 @@
+import argparse
+
+import pytest
+
+import scheduler_db
+import scheduler_cli
+
+
+def test_parse_days():
+  assert scheduler_cli.parse_days('5') == [5]
+  assert scheduler_cli.parse_days('3,10-12') == [3, 10, 11, 12]
+  for text in ['0', '8-5', 'x', '3,']:
+    with pytest.raises(argparse.ArgumentTypeError):
+      scheduler_cli.parse_days(text)
+
+
+def test_repair_rejects_days_outside_month(ward_db):
+  connection = scheduler_db.connect(ward_db([(2026, 11)]))
+  try:
+    with pytest.raises(ValueError):
+      scheduler_cli.repair_month(connection, 2026, 11, [30, 31])
+  finally:
+    connection.close()
@@ -0,0 +1,59 @@
+import random
+
+import scheduler_engine
+from scheduler_engine import day_off1, day_off2, business_travel
+from scheduler_engine import night_shift, day_shift, evening_shift
+from benchmarks import wards
+
+
+codes = ['', day_off1, day_off2, business_travel,
+         night_shift, day_shift, evening_shift]
+
+
+def test_running_counts_match_recount():
+  rng = random.Random(0)
+  days_in_month = 31
+  data = wards.synthetic_ward(30, days_in_month, seed=1).request_data
+  coverage = scheduler_engine.RequestCoverage(data, days_in_month)
+
+  for _ in range(500):
+    # staffs and the leader, the days off row, and the required rows
+    row = rng.choice([0, 1, 2, 3] + list(range(scheduler_engine.leader_offset,
+                                               len(data))))
+    col = rng.randint(2, days_in_month+1)
+    old_value = data[row][col]
+    if row == 0:
+      data[row][col] = not old_value
+    elif row < scheduler_engine.leader_offset:
+      data[row][col] = rng.randint(0, 8)
+    else:
+      data[row][col] = rng.choice(codes)
+    coverage.update_cell(row, col, old_value)
+    assert coverage.consistent()
+
+
+def test_highlight_counts_match_recount():
+  rng = random.Random(0)
+  days_in_month = 30
+  ward = wards.synthetic_ward(20, days_in_month, seed=2)
+  schedule_data = ward.schedule_data()
+  highlight = scheduler_engine.ScheduleHighlight(
+    schedule_data, ward.request_data, days_in_month)
+
+  for _ in range(500):
+    row = rng.randint(scheduler_engine.staff_offset, len(schedule_data)-1)
+    col = rng.randint(2, days_in_month+1)
+    old_value = schedule_data[row][col]
+    schedule_data[row][col] = rng.choice(codes)
+    highlight.update_cell(row, col, old_value)
+
+  recount = scheduler_engine.ScheduleHighlight(
+    schedule_data, ward.request_data, days_in_month)
+  assert highlight.counts == recount.counts
+  more = [highlight.is_more(row, col)
+          for row in range(len(schedule_data))
+          for col in range(2, days_in_month+2)]
+  denied = [highlight.is_denied(row, col)
+            for row in range(len(schedule_data))
+            for col in range(2, days_in_month+2)]
+  assert any(more) and any(denied)
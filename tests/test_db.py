@@ -0,0 +1,105 @@
+import sqlite3
+
+import pytest
+
+import scheduler_db
+import scheduler_engine
+from scheduler_engine import staff_offset, night_shift
+
+
+def test_migrate_keeps_months(ward_db):
+  year, month, days_in_month = 2026, 11, 30
+  connection = scheduler_db.connect(ward_db([(year, month)]))
+  try:
+    cursor = connection.cursor()
+    request_data = scheduler_db.load_month(cursor, 'requests', year, month)
+    schedule_data = scheduler_engine.prepare_schedule_data(
+      None, [list(row) for row in request_data],
+      scheduler_db.load_staffs(cursor), days_in_month)
+    scheduler_engine.update_totals(schedule_data, days_in_month)
+    scheduler_db.save_month(cursor, 'schedules', year, month, schedule_data)
+    connection.commit()
+
+    months = {}
+    for table in ['requests', 'schedules']:
+      months[table] = scheduler_db.load_month(cursor, table, year, month)
+    assert scheduler_db.storage_version(cursor) != \
+      scheduler_db.normalized_version
+
+    scheduler_db.migrate_to_normalized(connection)
+    assert scheduler_db.storage_version(cursor) == \
+      scheduler_db.normalized_version
+    for table, data in months.items():
+      assert scheduler_db.load_month_cells(cursor, table, year, month) == data
+
+    # a single edited cell is written on its own
+    data = months['schedules']
+    row, col = staff_offset+3, 5
+    data[row][col] = night_shift if data[row][col] != night_shift else ''
+    data[1][col] += 1
+    scheduler_engine.update_totals(data, days_in_month)
+    scheduler_db.save_cells(cursor, 'schedules', year, month, data,
+                            [(row, col), (1, col)])
+    connection.commit()
+    assert scheduler_db.load_month_cells(cursor, 'schedules', year,
+                                         month) == data
+    assert scheduler_db.load_month(cursor, 'requests', year,
+                                   month) == months['requests']
+  finally:
+    connection.close()
+
+
+def test_close_writes_queued_saves(ward_db):
+  path = ward_db([(2026, 11)])
+  database = scheduler_db.Database(path)
+  data = scheduler_db.load_month(database.cursor(), 'requests', 2026, 11)
+  data[staff_offset][2] = night_shift
+  queue = scheduler_db.SaveQueue()
+  queue.add('requests', 2026, 11, data, [(staff_offset, 2)])
+  scheduler_db.close_database(database, queue)
+  assert len(queue) == 0
+
+  connection = scheduler_db.connect(path)
+  try:
+    assert scheduler_db.load_month(connection.cursor(), 'requests',
+                                   2026, 11) == data
+  finally:
+    connection.close()
+
+
+def test_close_retries_locked_database(ward_db, monkeypatch):
+  path = ward_db([(2026, 11)])
+  save_month = scheduler_db.save_month
+  failures = []
+
+  def locked_save_month(*args):
+    if len(failures) < 2:
+      failures.append(args)
+      raise sqlite3.OperationalError('database is locked')
+    save_month(*args)
+
+  monkeypatch.setattr(scheduler_db, 'save_month', locked_save_month)
+  database = scheduler_db.Database(path)
+  data = scheduler_db.load_month(database.cursor(), 'requests', 2026, 11)
+  data[staff_offset][2] = night_shift
+  queue = scheduler_db.SaveQueue()
+  queue.add('requests', 2026, 11, data)
+  scheduler_db.close_database(database, queue, retry_delay=0)
+  assert len(failures) == 2 and len(queue) == 0
+
+  # the edits that still fail are reported and kept
+  failures[:] = []
+  database = scheduler_db.Database(path)
+  queue.add('requests', 2026, 11, data)
+  with pytest.raises(sqlite3.OperationalError):
+    scheduler_db.close_database(database, queue, retries=2, retry_delay=0)
+  assert len(queue) == 1
+  assert database.connections == []
+
+  monkeypatch.undo()
+  connection = scheduler_db.connect(path)
+  try:
+    assert scheduler_db.load_month(connection.cursor(), 'requests',
+                                   2026, 11) == data
+  finally:
+    connection.close()
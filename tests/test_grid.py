@@ -0,0 +1,18 @@
+import pytest
+
+from scheduler_grid import Grid
+from benchmarks import wards
+
+
+def test_json_round_trip():
+  data = wards.synthetic_ward(20, 31, seed=2).request_data
+  assert Grid.from_data(data).to_data() == data
+
+
+def test_unknown_codes_round_trip():
+  data = wards.synthetic_ward(10, 30, seed=3).request_data
+  data[6][1] = 'XX'
+  data[7][5] = 'YY'
+  with pytest.raises(ValueError):
+    Grid.from_data(data)
+  assert Grid.from_data(data, strict=False).to_data() == data
@@ -0,0 +1,25 @@
+import pytest
+
+import scheduler_db
+import scheduler_cli
+import scheduler_engine
+
+
+@pytest.mark.parametrize('seed', [0, 1, 2, 3])
+def test_plan_keeps_rest_across_months(ward_db, seed):
+  months = [(2026, 11), (2026, 12), (2027, 1)]
+  connection = scheduler_db.connect(ward_db(months, seed=seed))
+  profile = scheduler_engine.get_profile('quick').extended(5)
+  try:
+    results = scheduler_cli.plan_months(connection, 2026, 11, 3, 2,
+                                        profile=profile)
+    assert all(result.has_solution() for _, _, result in results)
+
+    cursor = connection.cursor()
+    for (y1, m1), (y2, m2) in zip(months, months[1:]):
+      last_month_data = scheduler_db.load_month(cursor, 'schedules', y1, m1)
+      schedule_data = scheduler_db.load_month(cursor, 'schedules', y2, m2)
+      assert scheduler_engine.boundary_rest_violations(
+        last_month_data, schedule_data) == []
+  finally:
+    connection.close()
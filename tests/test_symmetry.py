@@ -0,0 +1,56 @@
+import pytest
+
+import scheduler_engine
+from scheduler_engine import staff_offset, day_off1
+from scheduler_engine import night_shift, evening_shift
+
+
+def two_staff_month(days_in_month=30):
+  """
+  two staffs alike in everything, one night shift needed on the 1st
+  """
+
+  preferred = scheduler_engine.shift_types[1]
+  staffs = [(1, 'N0001', 'a', preferred), (2, 'N0002', 'b', preferred)]
+  leaders = [(1, 'L0001', 'leader')]
+  preference_data = scheduler_engine.prepare_request_data(
+    None, staffs, leaders, 0, days_in_month)
+  for n in range(1, 4):
+    for day in range(2, days_in_month+2):
+      preference_data[n][day] = 0
+  preference_data[1][2] = 1
+  schedule_data = scheduler_engine.prepare_schedule_data(
+    None, [list(row) for row in preference_data], staffs, days_in_month)
+  return schedule_data, preference_data
+
+
+@pytest.mark.parametrize('last_shifts', [(evening_shift, night_shift),
+                                         (night_shift, evening_shift)])
+def test_symmetry_keeps_last_month_rest(last_shifts):
+  days_in_month = 30
+  schedule_data, preference_data = two_staff_month(days_in_month)
+
+  # only the one who worked a night shift may take the night shift on the
+  # 1st, the other one worked an evening shift last
+  last_month_data = [list(row) for row in schedule_data]
+  for i, row in enumerate(last_month_data[staff_offset:]):
+    row[2:days_in_month+2] = [day_off1] * days_in_month
+    row[-2] = last_shifts[i]
+
+  records = [row[0] for row in schedule_data[staff_offset:]]
+  carry_over = scheduler_engine.prev_month_carry_over(last_month_data,
+                                                      records, 7)
+  last = scheduler_engine.prev_month_last_shifts(last_month_data, records)
+  assert scheduler_engine.staff_classes(
+    schedule_data, preference_data, days_in_month, carry_over, last) == []
+  assert scheduler_engine.staff_classes(
+    schedule_data, preference_data, days_in_month, carry_over,
+    [last[0], last[0]]) == [[staff_offset, staff_offset+1]]
+
+  for symmetry_breaking in [False, True]:
+    result = scheduler_engine.solve(
+      [list(row) for row in schedule_data], preference_data, days_in_month,
+      last_month_data=last_month_data, profile='quick',
+      symmetry_breaking=symmetry_breaking, cache=False)
+    assert result.status == 'OPTIMAL'
+    assert result.objective == 0
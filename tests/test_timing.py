@@ -0,0 +1,76 @@
+import threading
+import tracemalloc
+
+import pytest
+
+import scheduler_timing
+
+
+@pytest.fixture
+def timing(monkeypatch):
+  """
+  scheduler_timing with fresh module state, restored afterwards
+  """
+
+  for name, value in [('enabled', False), ('trace_memory', False),
+                      ('logger', None), ('log_handler', None),
+                      ('summary_path', None), ('phases', {}),
+                      ('open_phases', []), ('memory_peak', 0)]:
+    monkeypatch.setattr(scheduler_timing, name, value)
+  monkeypatch.setattr(scheduler_timing.atexit, 'register', lambda f: None)
+  yield scheduler_timing
+  if scheduler_timing.log_handler is not None:
+    scheduler_timing.logger.removeHandler(scheduler_timing.log_handler)
+    scheduler_timing.log_handler.close()
+  if tracemalloc.is_tracing():
+    tracemalloc.stop()
+
+
+def test_counts_calls(timing):
+  timing.enable()
+  for _ in range(3):
+    with timing.phase('build'):
+      pass
+  stats = timing.summary()['phases']['build']
+  assert stats['calls'] == 3
+  assert stats['longest'] <= stats['total']
+
+
+def test_process_peak_survives_later_phases(timing):
+  timing.enable(memory=True)
+  with timing.phase('big'):
+    data = bytearray(8 << 20)
+    del data
+  # starting another phase resets the tracemalloc peak
+  with timing.phase('small'):
+    pass
+  summary = timing.summary()
+  assert summary['memory_peak'] >= 8 << 20
+  assert summary['phases']['big']['memory'] >= 8 << 20
+  assert summary['phases']['small']['memory'] < 1 << 20
+
+
+def test_other_thread_keeps_open_phase_peak(timing):
+  timing.enable(memory=True)
+  with timing.phase('outer'):
+    data = bytearray(8 << 20)
+    del data
+    # a phase on another thread resets the peak while outer is open
+    def other():
+      with timing.phase('other'):
+        pass
+    thread = threading.Thread(target=other)
+    thread.start()
+    thread.join()
+  assert timing.summary()['phases']['outer']['memory'] >= 8 << 20
+
+
+def test_enable_twice_logs_once(timing, tmp_path):
+  path = str(tmp_path / 'timings.log')
+  timing.enable(log_path=path)
+  timing.enable(log_path=path)
+  with timing.phase('save'):
+    pass
+  timing.log_handler.flush()
+  with open(path) as f:
+    assert len(f.read().splitlines()) == 1